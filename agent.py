@@ -1,13 +1,23 @@
-import tkinter as tk
 import time
-import copy
-from game_2048 import Game2048
+import multiprocessing
+import os
+import queue
+import threading
+import bitboard
+from heuristic import DEFAULT_WEIGHTS_FILE, load_weights
+from search import Searcher, SearchTimeout
+
+
+# Tk and the GUI (game_2048) are imported where a window is needed, so that
+# importing this module, as the frozen executable's pool workers do, stays cheap
 
 
 class AI2048:
-    def __init__(self, game):
+    def __init__(self, game, searcher=None):
+        import tkinter as tk
+
         self.game = game
-        self.directions = ["up", "right", "down", "left"]
+        self.searcher = searcher if searcher is not None else Searcher()
 
         self.control_frame = tk.Frame(self.game.master, bg=self.game.master.cget('bg'))
         self.control_frame.pack(pady=5)
@@ -29,224 +39,212 @@ class AI2048:
         )
         self.stop_button.grid(row=0, column=1, padx=5)
 
-        self.is_running = False
-        self.move_delay = 20  # Move delay (ms)
+        # Turbo: play several moves per tick and redraw once
+        self.turbo_var = tk.BooleanVar(value=False)
+        self.turbo_check = tk.Checkbutton(
+            self.control_frame,
+            text="极速模式",
+            font=("Microsoft Yahei", 12),
+            variable=self.turbo_var,
+            bg=self.game.master.cget('bg')
+        )
+        self.turbo_check.grid(row=0, column=2, padx=5)
+
+        self.speed_label = tk.Label(
+            self.control_frame,
+            text="速度: - 步/秒",
+            font=("Microsoft Yahei", 10),
+            bg=self.game.master.cget('bg')
+        )
+        self.speed_label.grid(row=1, column=0, columnspan=2, padx=5)
 
-        # Weights
-        self.weight_matrix = [
-            [2 ** 3, 2 ** 2, 2 ** 1, 2 ** 0],
-            [2 ** 4, 2 ** 5, 2 ** 6, 2 ** 7],
-            [2 ** 11, 2 ** 10, 2 ** 9, 2 ** 8],
-            [2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15],
-        ]
-
-    def evaluate_position(self, grid):
-        """评估当前局面分数 - 这是AI用来选择最佳移动的评分，不是游戏分数"""
-        score = 0
-        empty_cells = 0
-        max_tile = 0
-        merges = 0
-
-        # Positional Weight
-        for i in range(4):
-            for j in range(4):
-                if grid[i][j] == 0:
-                    empty_cells += 1
-                else:
-                    # 基础位置得分
-                    score += grid[i][j] * self.weight_matrix[i][j]
-                    max_tile = max(max_tile, grid[i][j])
-
-        # Check possible merges
-        for i in range(4):
-            for j in range(3):
-                # Merge horizontally
-                if grid[i][j] != 0 and grid[i][j] == grid[i][j + 1]:
-                    merges += 1
-                # Merge vertically
-                if grid[j][i] != 0 and grid[j][i] == grid[j + 1][i]:
-                    merges += 1
-
-        # Smoothness Score: Variance of adjacent numbers
-        smoothness = 0
-        for i in range(4):
-            for j in range(4):
-                if grid[i][j] != 0:
-                    # Right Check
-                    if j < 3 and grid[i][j + 1] != 0:
-                        smoothness -= abs(grid[i][j] - grid[i][j + 1])
-                    # Bottom Check
-                    if i < 3 and grid[i + 1][j] != 0:
-                        smoothness -= abs(grid[i][j] - grid[i + 1][j])
-
-        monotonicity = 0
-        # Check Monotonicity for Each Row
-        for i in range(4):
-            current_row = [x if x != 0 else float('-inf') for x in grid[i]]
-            if all(current_row[j] >= current_row[j + 1] for j in range(3)):
-                monotonicity += sum(x for x in current_row if x != float('-inf'))
-
-        # Check Monotonicity for Each Column
-        for j in range(4):
-            current_col = [grid[i][j] if grid[i][j] != 0 else float('-inf') for i in range(4)]
-            if all(current_col[i] >= current_col[i + 1] for i in range(3)):
-                monotonicity += sum(x for x in current_col if x != float('-inf'))
-
-        # Overall Evaluation Score
-        final_score = (
-                score * 1.0 +
-                empty_cells * 2000.0 +
-                merges * 800.0 +
-                smoothness * 100.0 +
-                monotonicity * 2.0 +
-                (max_tile ** 2) * 1.0
+        self.depth_label = tk.Label(
+            self.control_frame,
+            text="搜索深度: -",
+            font=("Microsoft Yahei", 10),
+            bg=self.game.master.cget('bg')
         )
+        self.depth_label.grid(row=1, column=2, padx=5)
 
-        return final_score
+        self.is_running = False
+        self.move_delay = 20  # Move delay (ms)
 
-    def simulate_move(self, grid, direction):
-        new_grid = [row[:] for row in grid]
-        if direction == "left":
-            new_grid = self.game.move_left(new_grid, simulate=True)
-        elif direction == "right":
-            new_grid = self.game.move_right(new_grid, simulate=True)
-        elif direction == "up":
-            new_grid = self.game.move_up(new_grid, simulate=True)
-        else:
-            new_grid = self.game.move_down(new_grid, simulate=True)
-
-        return new_grid, new_grid != grid
-
-    def get_empty_cells(self, grid):
-        """获取空格子的位置"""
-        empty_cells = []
-        for i in range(4):
-            for j in range(4):
-                if grid[i][j] == 0:
-                    empty_cells.append((i, j))
-        return empty_cells
-
-    def expectimax(self, grid, depth, is_max):
-        """使用Expectimax算法进行搜索"""
-        if depth == 0:
-            return self.evaluate_position(grid)
-
-        if is_max:
-            max_score = float('-inf')
-            for direction in self.directions:
-                new_grid, moved = self.simulate_move(grid, direction)
-                if moved:
-                    score = self.expectimax(new_grid, depth - 1, False)
-                    max_score = max(max_score, score)
-            return max_score if max_score != float('-inf') else self.evaluate_position(grid)
-        else:
-            empty_cells = self.get_empty_cells(grid)
-            if not empty_cells:
-                return self.evaluate_position(grid)
-
-            avg_score = 0
-            possibilities = len(empty_cells)
-
-            for i, j in empty_cells:
-                grid_with_2 = [row[:] for row in grid]
-                grid_with_4 = [row[:] for row in grid]
-                grid_with_2[i][j] = 2
-                grid_with_4[i][j] = 4
-
-                score = (0.9 * self.expectimax(grid_with_2, depth - 1, True) +
-                         0.1 * self.expectimax(grid_with_4, depth - 1, True))
-                avg_score += score / possibilities
-
-            return avg_score
-
-    def alpha_beta(self, grid, depth, is_max, alpha=float('-inf'), beta=float('inf')):
-        """使用Expectimax算法和Alpha-Beta剪枝进行搜索"""
-        if depth == 0 or not self.get_empty_cells(grid):
-            return self.evaluate_position(grid)
-
-        if is_max:
-            max_score = float('-inf')
-            for direction in self.directions:
-                new_grid, moved = self.simulate_move(grid, direction)
-                if moved:
-                    score = self.alpha_beta(new_grid, depth - 1, False, alpha, beta)
-                    max_score = max(max_score, score)
-                    alpha = max(alpha, score)
-                    if beta <= alpha:
-                        break
-            return max_score if max_score != float('-inf') else self.evaluate_position(grid)
-        else:
-            avg_score = 0
-            empty_cells = self.get_empty_cells(grid)
-            possibilities = len(empty_cells)
-
-            for i, j in empty_cells:
-                grid_with_2 = [row[:] for row in grid]
-                grid_with_4 = [row[:] for row in grid]
-                grid_with_2[i][j] = 2
-                grid_with_4[i][j] = 4
-
-                score = (0.9 * self.alpha_beta(grid_with_2, depth - 1, True, alpha, beta) +
-                        0.1 * self.alpha_beta(grid_with_4, depth - 1, True, alpha, beta))
-                avg_score += score / possibilities
-
-                beta = min(beta, avg_score)
-                if beta <= alpha:
-                    break
+        # The search runs on a background thread, the Tk thread polls for its result
+        self.poll_interval = 16  # ms, about 60 fps
+        self._results = queue.Queue()
+        self._search_thread = None
+        # Bumped on every start/stop so results of an abandoned search are ignored
+        self._generation = 0
 
-            return avg_score
+        # A turbo tick stops after turbo_moves moves or turbo_slice_ms, whichever comes first
+        self.turbo_moves = 8
+        self.turbo_slice_ms = 50
+        self._rate_start = time.perf_counter()
+        self._rate_moves = 0
+        self._rate_depth = 0
 
     def get_best_move(self):
         """获取最佳移动方向"""
-        best_score = float('-inf')
-        best_direction = None
-
-        # Evaluate every possible direction
-        for direction in self.directions:
-            new_grid, moved = self.simulate_move(self.game.grid, direction)
-            if moved:
-                # Evaluate by expectimax
-                score = self.expectimax(new_grid, depth=3, is_max=False)
-                if score > best_score:
-                    best_score = score
-                    best_direction = direction
-
-        return best_direction
+        return self.searcher.get_best_move(self.game.grid)
 
     def make_move(self):
-        """执行一步AI移动"""
+        """在后台线程中开始搜索下一步，界面保持响应"""
         if not self.is_running:
             return
 
-        direction = self.get_best_move()
+        if self._search_thread is not None and self._search_thread.is_alive():
+            # A cancelled search is still unwinding
+            self.game.master.after(self.poll_interval, self.make_move)
+            return
 
-        if direction:
-            self.game.move(direction)
+        board = bitboard.to_board(self.game.grid)
+        generation = self._generation
+        self.searcher.clear_cancel()
+        if self.turbo_var.get():
+            # Plays ahead on a copy, the moves are replayed on the real game afterwards
+            target, args = self._search_turbo, (self.game.engine.copy(), board, generation)
+        else:
+            target, args = self._search, (board, generation)
+        self._search_thread = threading.Thread(target=target, args=args, daemon=True)
+        self._search_thread.start()
+        self.game.master.after(self.poll_interval, self._poll_search, generation)
+
+    def _search(self, board, generation):
+        """后台线程: 搜索并把结果放入队列"""
+        try:
+            direction = self.searcher.choose_move(board)
+        except SearchTimeout:
+            # Cancelled by stop_ai
+            direction = None
+        moves = [direction] if direction else []
+        self._results.put((generation, board, moves, self.searcher.last_depth))
+
+    def _search_turbo(self, engine, board, generation):
+        """后台线程: 在局面副本上连续走若干步，把走法列表放入队列"""
+        moves = []
+        depth_total = 0
+        deadline = time.perf_counter() + self.turbo_slice_ms / 1000.0
+        try:
+            while len(moves) < self.turbo_moves:
+                direction = self.searcher.choose_move(bitboard.to_board(engine.grid))
+                if direction is None:
+                    break
+                engine.move(direction)
+                moves.append(direction)
+                depth_total += self.searcher.last_depth
+                if time.perf_counter() >= deadline or not engine.can_move():
+                    break
+        except SearchTimeout:
+            pass
+        depth = depth_total / len(moves) if moves else 0
+        self._results.put((generation, board, moves, depth))
+
+    def _poll_search(self, generation):
+        """主线程: 检查搜索是否完成，完成后执行移动"""
+        if not self.is_running or generation != self._generation:
+            return
 
-            if not self.game.can_move():
-                self.stop_ai()
+        while True:
+            try:
+                result_generation, board, moves, depth = self._results.get_nowait()
+            except queue.Empty:
+                self.game.master.after(self.poll_interval, self._poll_search, generation)
                 return
+            # Skip results left over from a search that was cancelled earlier
+            if result_generation == generation:
+                break
 
-            self.game.master.after(self.move_delay, self.make_move)
+        if board != bitboard.to_board(self.game.grid):
+            # The board changed while thinking (manual move, undo, new game), search again
+            self.make_move()
+            return
+
+        if not moves:
+            self.stop_ai()
+            return
+
+        # The copy used the same random state, so replaying gives the same tiles
+        for direction in moves:
+            self.game.move(direction, render=False)
+        self.game.update_display()
+        self._update_readouts(len(moves), depth)
+
+        if not self.game.can_move():
+            self.stop_ai()
+            return
+
+        delay = 1 if self.turbo_var.get() else self.move_delay
+        self.game.master.after(delay, self.make_move)
+
+    def _update_readouts(self, moves, depth):
+        """更新每秒步数和搜索深度的显示"""
+        self._rate_moves += moves
+        self._rate_depth += depth * moves
+        now = time.perf_counter()
+        elapsed = now - self._rate_start
+        if elapsed >= 0.5:
+            self.speed_label.config(text=f"速度: {self._rate_moves / elapsed:.1f} 步/秒")
+            self.depth_label.config(text=f"搜索深度: {self._rate_depth / self._rate_moves:.1f}")
+            self._rate_start = now
+            self._rate_moves = 0
+            self._rate_depth = 0
 
     def start_ai(self):
         """启动AI"""
+        import tkinter as tk
+
         self.is_running = True
+        self._generation += 1
+        self._rate_start = time.perf_counter()
+        self._rate_moves = 0
+        self._rate_depth = 0
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
         self.make_move()
 
     def stop_ai(self):
         """停止AI"""
+        import tkinter as tk
+
         self.is_running = False
+        self._generation += 1
+        self.searcher.cancel()
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
 
 
 def main():
+    # Needed by the frozen executable when the searcher uses a process pool
+    multiprocessing.freeze_support()
+    from game_2048 import Game2048, build_parser
+
+    parser = build_parser()
+    parser.add_argument("--weights", default=None,
+                        help=f"权重配置文件 (tuner.py 的输出)，默认在存在时读取 {DEFAULT_WEIGHTS_FILE}")
+    parser.add_argument("--evaluator", default=None,
+                        help="n-tuple 网络权重文件 (ntuple.py 的输出)，代替默认评估函数")
+    parser.add_argument("--book", default=None, help="开局库文件 (opening.py 的输出)")
+    parser.add_argument("--startup-only", action="store_true",
+                        help="完成初始化 (导入模块、加载查找表、创建搜索器) 后不打开窗口直接退出，用于测量启动时间")
+    args = parser.parse_args()
+    weights_file = args.weights
+    if weights_file is None and os.path.exists(DEFAULT_WEIGHTS_FILE):
+        weights_file = DEFAULT_WEIGHTS_FILE
+    config = load_weights(weights_file) if weights_file else {}
+    if args.evaluator:
+        config["evaluator"] = args.evaluator
+    if args.book:
+        config["book"] = args.book
+    searcher = Searcher(**config)
+    if args.startup_only:
+        searcher.close()
+        return
+
+    import tkinter as tk
+
     root = tk.Tk()
-    game = Game2048(root)
-    ai = AI2048(game)
+    game = Game2048(root, seed=args.seed)
+    ai = AI2048(game, searcher)
     root.mainloop()
 
 
@@ -0,0 +1,290 @@
+"""
+性能基准测试
+
+在固定的棋盘集合 (开局、中局、残局各若干个) 和固定种子上测量热点代码的速度:
+- 每秒移动次数: GameEngine 的列表实现 (stack/combine) 和 bitboard 查表实现
+- 每秒评估次数: evaluate_position (列表) 和 evaluate_board (查表)
+- 深度 2~5 的每秒搜索节点数
+- 固定种子下完整对局的用时
+- 启动用时: agent.py (以及 --exe 指定的打包程序) 从启动到可以开始游戏的用时，
+  分别在查找表没有缓存 (冷启动) 和已经缓存 (热启动) 时测量，不打开窗口
+
+每项取多次重复中最好的一次，结果可以保存为基准 JSON，之后与基准对比，
+变慢超过阈值的项目会被标出，并以退出码 1 结束 (方便放进 CI)。
+
+用法示例:
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.1
+    python benchmark.py --quick --startup --exe dist/agent.exe
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import bitboard
+from engine import GameEngine
+from search import Searcher
+
+# Fixed corpus, recorded from seeded depth-2 games: packed boards (see bitboard.py)
+CORPUS = {
+    "early": [
+        0x6300131020001000, 0x5140341031000001, 0x5540310000002100,
+        0x6300210020001010, 0x6633320220100000,
+    ],
+    "mid": [
+        0x7311420020000001, 0x9773140031011000, 0x8753445010002010,
+        0x7414001310010001, 0x4983034200020010, 0x8764113200211000,
+    ],
+    "late": [
+        0xa631023101130001, 0xb362023500111003, 0xba53056300320011,
+        0xa962141133210000, 0xa913246822510301, 0xb984456314110000,
+    ],
+}
+
+SEARCH_DEPTHS = (2, 3, 4, 5)
+GAME_SEED = 1
+GAME_DEPTH = 2
+
+# Metrics measured in seconds, where smaller is better; every other metric is a rate
+TIME_METRICS = {"game_seconds", "startup_script_cold_seconds", "startup_script_warm_seconds",
+                "startup_exe_cold_seconds", "startup_exe_warm_seconds"}
+
+AGENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent.py")
+
+
+def corpus_boards():
+    return [board for boards in CORPUS.values() for board in boards]
+
+
+def _best_time(func, repeat):
+    """运行 repeat 次，返回最短用时 (秒)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_engine_moves(repeat, rounds=200):
+    """列表实现的每秒移动次数"""
+    engine = GameEngine()
+    grids = [bitboard.to_grid(board) for board in corpus_boards()]
+    moves = [engine.move_up, engine.move_right, engine.move_down, engine.move_left]
+
+    def run():
+        for _ in range(rounds):
+            for grid in grids:
+                for move in moves:
+                    move(grid, simulate=True)
+
+    return rounds * len(grids) * 4 / _best_time(run, repeat)
+
+
+def bench_bitboard_moves(repeat, rounds=2000):
+    """查表实现的每秒移动次数"""
+    boards = corpus_boards()
+    moves = [bitboard.move_up, bitboard.move_right, bitboard.move_down, bitboard.move_left]
+
+    def run():
+        for _ in range(rounds):
+            for board in boards:
+                for move in moves:
+                    move(board)
+
+    return rounds * len(boards) * 4 / _best_time(run, repeat)
+
+
+def bench_evaluate_position(searcher, repeat, rounds=100):
+    grids = [bitboard.to_grid(board) for board in corpus_boards()]
+
+    def run():
+        for _ in range(rounds):
+            for grid in grids:
+                searcher.evaluate_position(grid)
+
+    return rounds * len(grids) / _best_time(run, repeat)
+
+
+def bench_evaluate_board(searcher, repeat, rounds=2000):
+    boards = corpus_boards()
+
+    def run():
+        for _ in range(rounds):
+            for board in boards:
+                searcher.evaluate_board(board)
+
+    return rounds * len(boards) / _best_time(run, repeat)
+
+
+def bench_search(depth, repeat, boards):
+    """固定深度搜索的每秒节点数 (每个棋盘都从空的置换表开始)"""
+    searcher = Searcher(depth=depth)
+    best = 0.0
+    for _ in range(repeat):
+        nodes = 0
+        elapsed = 0.0
+        for board in boards:
+            searcher.transposition.clear()
+            searcher.nodes = 0
+            start = time.perf_counter()
+            searcher.choose_move(board)
+            elapsed += time.perf_counter() - start
+            nodes += searcher.nodes
+        best = max(best, nodes / elapsed)
+    return best
+
+
+def bench_game(repeat, seed=GAME_SEED, depth=GAME_DEPTH):
+    """固定种子完整下一局的用时 (秒) 和步数"""
+    searcher = Searcher(depth=depth)
+    moves = 0
+
+    def run():
+        nonlocal moves
+        searcher.transposition.clear()
+        engine = GameEngine(seed=seed)
+        engine.reset()
+        moves = 0
+        while engine.can_move():
+            direction = searcher.get_best_move(engine.grid)
+            if direction is None:
+                break
+            engine.move(direction)
+            moves += 1
+
+    return _best_time(run, repeat), moves
+
+
+def bench_startup(command, repeat):
+    """测量 command 的启动用时，返回 (冷启动秒数, 热启动秒数)
+
+    每次冷启动都使用一个空的缓存目录，热启动共用一个已经写好缓存的目录。
+    """
+    def run(cache):
+        env = dict(os.environ, JASMIANA_2048_CACHE=cache)
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        return time.perf_counter() - start
+
+    cold = float('inf')
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as cache:
+            cold = min(cold, run(cache))
+    with tempfile.TemporaryDirectory() as cache:
+        run(cache)
+        warm = min(run(cache) for _ in range(repeat))
+    return cold, warm
+
+
+def run_benchmarks(repeat=3, quick=False, depths=SEARCH_DEPTHS, log=None, startup=False, exe=None):
+    """运行全部基准测试，返回 {指标: 数值}"""
+    def note(message):
+        if log is not None:
+            print(message, file=log, flush=True)
+
+    searcher = Searcher()
+    results = {}
+    results["engine_moves_per_second"] = bench_engine_moves(repeat)
+    note(f"列表移动: {results['engine_moves_per_second']:.0f} 次/秒")
+    results["bitboard_moves_per_second"] = bench_bitboard_moves(repeat)
+    note(f"查表移动: {results['bitboard_moves_per_second']:.0f} 次/秒")
+    results["evaluate_position_per_second"] = bench_evaluate_position(searcher, repeat)
+    note(f"evaluate_position: {results['evaluate_position_per_second']:.0f} 次/秒")
+    results["evaluate_board_per_second"] = bench_evaluate_board(searcher, repeat)
+    note(f"evaluate_board: {results['evaluate_board_per_second']:.0f} 次/秒")
+
+    for depth in depths:
+        if quick and depth > 3:
+            continue
+        # Deep searches use one board per game phase to keep the run short
+        if depth >= 4:
+            boards = [phase[0] for phase in CORPUS.values()]
+        else:
+            boards = corpus_boards()
+        key = f"search_depth_{depth}_nodes_per_second"
+        results[key] = bench_search(depth, 1 if depth >= 5 else repeat, boards)
+        note(f"深度 {depth} 搜索: {results[key]:.0f} 节点/秒")
+
+    if not quick:
+        seconds, moves = bench_game(repeat)
+        results["game_seconds"] = seconds
+        results["game_moves"] = moves
+        note(f"完整对局 (种子 {GAME_SEED}, 深度 {GAME_DEPTH}): {seconds:.2f}s, {moves} 步")
+
+    if startup or not quick:
+        targets = [("script", [sys.executable, AGENT_SCRIPT, "--startup-only"])]
+        if exe:
+            targets.append(("exe", [exe, "--startup-only"]))
+        for name, command in targets:
+            cold, warm = bench_startup(command, repeat)
+            results[f"startup_{name}_cold_seconds"] = cold
+            results[f"startup_{name}_warm_seconds"] = warm
+            note(f"启动用时 ({name}): 冷启动 {cold:.3f}s, 热启动 {warm:.3f}s")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """与基准对比，返回 [(指标, 基准值, 当前值, 变化比例, 是否退步)]"""
+    rows = []
+    for key, base in baseline.items():
+        if key not in results or not isinstance(base, (int, float)) or key == "game_moves" or not base:
+            continue
+        current = results[key]
+        change = current / base - 1.0
+        if key in TIME_METRICS:
+            regressed = change > threshold
+        else:
+            regressed = change < -threshold
+        rows.append((key, base, current, change, regressed))
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="2048 引擎、评估函数和搜索的性能基准测试")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数 (取最好的一次)")
+    parser.add_argument("--quick", action="store_true", help="只测深度 3 以内的搜索，不跑完整对局和启动用时")
+    parser.add_argument("--depths", type=int, nargs="+", default=list(SEARCH_DEPTHS), help="测试的搜索深度")
+    parser.add_argument("--startup", action="store_true", help="--quick 时也测量启动用时")
+    parser.add_argument("--exe", default=None, help="同时测量打包后的程序 (如 dist/agent.exe) 的启动用时")
+    parser.add_argument("--save", default=None, help="把结果保存为基准 JSON")
+    parser.add_argument("--compare", default=None, help="与该基准 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="允许的退步比例 (0.1 表示慢 10%% 以内不算退步)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = run_benchmarks(args.repeat, args.quick, args.depths, log=sys.stdout,
+                             startup=args.startup, exe=args.exe)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+        print(f"结果已保存到 {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.threshold)
+        print(f"\n与基准 {args.compare} 对比 (阈值 {args.threshold * 100:.0f}%):")
+        for key, base, current, change, regressed in rows:
+            mark = "  <-- 退步" if regressed else ""
+            print(f"{key}: {base:.4g} -> {current:.4g} ({change * 100:+.1f}%){mark}")
+        if "game_moves" in results and results["game_moves"] != baseline.get("game_moves", results["game_moves"]):
+            # A different number of moves means the AI now plays differently, not just faster
+            print(f"注意: 完整对局的步数从 {baseline['game_moves']} 变为 {results['game_moves']}，用时不可直接比较")
+        if any(row[4] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+64位压缩棋盘 (bitboard)
+
+每个格子占4位，存储方块数值的指数 (0 表示空格, 1 表示 2, 2 表示 4, ... 15 表示 32768)。
+第 i 行占据第 16*i ~ 16*i+15 位，行内第 j 列位于第 4*j 位。
+
+行移动通过预先计算好的 65536 项查找表完成，上下移动通过转置后查列表完成，
+搜索过程中无需创建任何列表。查找表第一次构建后缓存在磁盘上 (见 tablecache.py)。
+
+4 位的指数最大到 32768 (MAX_TILE)，压缩棋盘上两个 32768 不会合并，更大的方块也放不下；
+GameEngine 和撤回历史在出现这么大的方块时改用列表网格。
+"""
+
+from tablecache import load_tables
+
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+
+DIRECTIONS = ["up", "right", "down", "left"]
+# Largest tile a 4-bit exponent holds; on a packed board it never merges
+MAX_TILE = 32768
+
+
+def _reverse_row(row):
+    """翻转一行 (16位)"""
+    return ((row >> 12) & 0xF) | ((row >> 4) & 0xF0) | ((row << 4) & 0xF00) | ((row << 12) & 0xF000)
+
+
+def _unpack_col(row):
+    """把一行 (16位) 展开为一列 (每格间隔16位)"""
+    return (row & 0xF) | ((row & 0xF0) << 12) | ((row & 0xF00) << 24) | ((row & 0xF000) << 36)
+
+
+def _slide_row_left(line):
+    """对一行指数向左移动并合并，返回 (新行, 得分)"""
+    tiles = [x for x in line if x != 0]
+    result = []
+    score = 0
+    i = 0
+    while i < len(tiles):
+        # Exponent 15 (32768) cannot merge further within 4 bits
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1] and tiles[i] != 0xF:
+            result.append(tiles[i] + 1)
+            score += 2 ** (tiles[i] + 1)
+            i += 2
+        else:
+            result.append(tiles[i])
+            i += 1
+    result += [0] * (4 - len(result))
+    return result, score
+
+
+def _build_tables():
+    row_left = [0] * 65536
+    row_right = [0] * 65536
+    score_left = [0] * 65536
+    score_right = [0] * 65536
+    col_up = [0] * 65536
+    col_down = [0] * 65536
+    row_sum = [0] * 65536
+
+    for row in range(65536):
+        line = [(row >> (4 * j)) & 0xF for j in range(4)]
+        result, score = _slide_row_left(line)
+        new_row = result[0] | (result[1] << 4) | (result[2] << 8) | (result[3] << 12)
+
+        rev_row = _reverse_row(row)
+        rev_new_row = _reverse_row(new_row)
+
+        row_left[row] = new_row
+        score_left[row] = score
+        row_right[rev_row] = rev_new_row
+        score_right[rev_row] = score
+        col_up[row] = _unpack_col(new_row)
+        col_down[rev_row] = _unpack_col(rev_new_row)
+        row_sum[row] = sum(1 << x for x in line if x)
+
+    # Bit 0: the row can slide left, bit 1: it can slide right
+    can_move = [(row_left[row] != row) | (row_right[row] != row) << 1 for row in range(65536)]
+
+    return [("H", row_left), ("H", row_right), ("I", score_left), ("I", score_right),
+            ("Q", col_up), ("Q", col_down), ("I", row_sum), ("B", can_move)]
+
+
+# Bump when the tables built above change, so stale disk caches are not used
+TABLE_VERSION = 1
+
+(ROW_LEFT, ROW_RIGHT, SCORE_LEFT, SCORE_RIGHT, COL_UP, COL_DOWN, ROW_SUM,
+ ROW_CAN_MOVE) = load_tables("bitboard", ("bitboard", TABLE_VERSION), _build_tables)
+
+# Bit of each direction in legal_mask(), following the order of DIRECTIONS
+DIRECTION_BITS = {direction: 1 << i for i, direction in enumerate(DIRECTIONS)}
+
+
+def to_board(grid):
+    """把 4x4 列表网格转换为压缩棋盘"""
+    board = 0
+    shift = 0
+    for i in range(4):
+        for j in range(4):
+            value = grid[i][j]
+            if value:
+                board |= (value.bit_length() - 1) << shift
+            shift += 4
+    return board
+
+
+def to_grid(board):
+    """把压缩棋盘转换为 4x4 列表网格"""
+    grid = []
+    for i in range(4):
+        row = []
+        for j in range(4):
+            exp = (board >> (16 * i + 4 * j)) & 0xF
+            row.append(1 << exp if exp else 0)
+        grid.append(row)
+    return grid
+
+
+def transpose(board):
+    """转置棋盘 (行列互换)"""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def mirror(board):
+    """左右翻转棋盘 (每行倒序)"""
+    x = ((board >> 4) & 0x0F0F0F0F0F0F0F0F) | ((board & 0x0F0F0F0F0F0F0F0F) << 4)
+    return ((x >> 8) & 0x00FF00FF00FF00FF) | ((x & 0x00FF00FF00FF00FF) << 8)
+
+
+def flip(board):
+    """上下翻转棋盘 (行倒序)"""
+    return (((board & 0xFFFF) << 48) | (((board >> 16) & 0xFFFF) << 32) |
+            (((board >> 32) & 0xFFFF) << 16) | (board >> 48))
+
+
+def symmetries(board):
+    """返回棋盘的 8 个对称变换 (旋转和翻转)"""
+    t = transpose(board)
+    m = mirror(board)
+    tm = mirror(t)
+    return board, m, flip(board), flip(m), t, tm, flip(t), flip(tm)
+
+
+_MIRROR_DIRECTION = {"up": "up", "right": "left", "down": "down", "left": "right"}
+_FLIP_DIRECTION = {"up": "down", "right": "right", "down": "up", "left": "left"}
+_TRANSPOSE_DIRECTION = {"up": "left", "right": "down", "down": "right", "left": "up"}
+
+# Transforms making up each entry of symmetries(), in the order they are applied
+_SYMMETRY_STEPS = (
+    (),
+    (_MIRROR_DIRECTION,),
+    (_FLIP_DIRECTION,),
+    (_MIRROR_DIRECTION, _FLIP_DIRECTION),
+    (_TRANSPOSE_DIRECTION,),
+    (_TRANSPOSE_DIRECTION, _MIRROR_DIRECTION),
+    (_TRANSPOSE_DIRECTION, _FLIP_DIRECTION),
+    (_TRANSPOSE_DIRECTION, _MIRROR_DIRECTION, _FLIP_DIRECTION),
+)
+
+
+def canonical(board):
+    """返回 (8 个对称变换中最小的棋盘, 该变换在 symmetries() 中的下标)"""
+    boards = symmetries(board)
+    smallest = min(boards)
+    return smallest, boards.index(smallest)
+
+
+def direction_from_symmetry(index, direction):
+    """把第 index 个对称变换后棋盘上的移动方向换算回原棋盘上的方向"""
+    # Every step is its own inverse, so undo them in reverse order
+    for step in reversed(_SYMMETRY_STEPS[index]):
+        direction = step[direction]
+    return direction
+
+
+def move_left(board):
+    return (ROW_LEFT[board & ROW_MASK] |
+            (ROW_LEFT[(board >> 16) & ROW_MASK] << 16) |
+            (ROW_LEFT[(board >> 32) & ROW_MASK] << 32) |
+            (ROW_LEFT[(board >> 48) & ROW_MASK] << 48))
+
+
+def move_right(board):
+    return (ROW_RIGHT[board & ROW_MASK] |
+            (ROW_RIGHT[(board >> 16) & ROW_MASK] << 16) |
+            (ROW_RIGHT[(board >> 32) & ROW_MASK] << 32) |
+            (ROW_RIGHT[(board >> 48) & ROW_MASK] << 48))
+
+
+def move_up(board):
+    t = transpose(board)
+    return (COL_UP[t & ROW_MASK] |
+            (COL_UP[(t >> 16) & ROW_MASK] << 4) |
+            (COL_UP[(t >> 32) & ROW_MASK] << 8) |
+            (COL_UP[(t >> 48) & ROW_MASK] << 12))
+
+
+def move_down(board):
+    t = transpose(board)
+    return (COL_DOWN[t & ROW_MASK] |
+            (COL_DOWN[(t >> 16) & ROW_MASK] << 4) |
+            (COL_DOWN[(t >> 32) & ROW_MASK] << 8) |
+            (COL_DOWN[(t >> 48) & ROW_MASK] << 12))
+
+
+def legal_mask(board):
+    """一次算出所有可以移动的方向，返回位掩码 (见 DIRECTION_BITS)"""
+    rows = (ROW_CAN_MOVE[board & ROW_MASK] | ROW_CAN_MOVE[(board >> 16) & ROW_MASK] |
+            ROW_CAN_MOVE[(board >> 32) & ROW_MASK] | ROW_CAN_MOVE[(board >> 48) & ROW_MASK])
+    t = transpose(board)
+    cols = (ROW_CAN_MOVE[t & ROW_MASK] | ROW_CAN_MOVE[(t >> 16) & ROW_MASK] |
+            ROW_CAN_MOVE[(t >> 32) & ROW_MASK] | ROW_CAN_MOVE[(t >> 48) & ROW_MASK])
+    # Columns slide "left" when moving up and "right" when moving down
+    return (cols & 1) | (rows & 2) | (cols & 2) << 1 | (rows & 1) << 3
+
+
+def legal_moves(board):
+    """返回所有可以移动的方向 (按 DIRECTIONS 的顺序)"""
+    mask = legal_mask(board)
+    return [direction for direction in DIRECTIONS if mask & DIRECTION_BITS[direction]]
+
+
+def score_gain(board, direction):
+    """按方向移动时合并得到的分数"""
+    if direction in ("up", "down"):
+        board = transpose(board)
+    table = SCORE_LEFT if direction in ("left", "up") else SCORE_RIGHT
+    return (table[board & ROW_MASK] + table[(board >> 16) & ROW_MASK] +
+            table[(board >> 32) & ROW_MASK] + table[(board >> 48) & ROW_MASK])
+
+
+MOVES = {
+    "up": move_up,
+    "right": move_right,
+    "down": move_down,
+    "left": move_left,
+}
+
+
+def move(board, direction):
+    """按方向移动，返回新棋盘"""
+    return MOVES[direction](board)
+
+
+def empty_shifts(board):
+    """返回所有空格子的位移量 (按行优先顺序)"""
+    return [shift for shift in range(0, 64, 4) if not (board >> shift) & 0xF]
+
+
+def count_empty(board):
+    """统计空格子的数量"""
+    # Collapse every nibble into its lowest bit, then count the zero nibbles
+    x = board | (board >> 2)
+    x |= x >> 1
+    x &= 0x1111111111111111
+    return 16 - bin(x).count("1")
+
+
+def tile_sum(board):
+    """返回所有方块数值之和"""
+    return (ROW_SUM[board & ROW_MASK] + ROW_SUM[(board >> 16) & ROW_MASK] +
+            ROW_SUM[(board >> 32) & ROW_MASK] + ROW_SUM[(board >> 48) & ROW_MASK])
+
+
+def distinct_tiles(board):
+    """统计不同数值的方块种类数"""
+    seen = 0
+    while board:
+        seen |= 1 << (board & 0xF)
+        board >>= 4
+    return bin(seen >> 1).count("1")
+
+
+def max_exponent(board):
+    """返回最大方块的指数"""
+    result = 0
+    while board:
+        exp = board & 0xF
+        if exp > result:
+            result = exp
+        board >>= 4
+    return result
@@ -0,0 +1,76 @@
+"""
+搜索深度策略
+
+根据局面决定每一步的搜索深度 (Searcher 的 depth_policy 参数)。
+策略是一个可调用对象: 传入压缩棋盘，返回深度。
+
+- FixedDepth: 固定深度 (与不设策略相同)
+- AdaptiveDepth: 空格多的开阔局面 Chance 节点分支多、局面也安全，用浅搜索；
+  空格少的紧张局面分支少、容易走错，用深搜索 (也可按方块种类数加深)。
+
+深度的含义与 Searcher.depth 相同，奇数深度以 Max 节点 (评估) 结束。
+"""
+
+import bitboard
+
+
+class FixedDepth:
+    def __init__(self, depth=3):
+        self.depth = depth
+
+    def __call__(self, board):
+        return self.depth
+
+    def config(self):
+        return {"name": "fixed", "depth": self.depth}
+
+
+class AdaptiveDepth:
+    def __init__(self, shallow=1, normal=3, deep=5, open_empty=8, tight_empty=1, deep_distinct=None):
+        """空格数 >= open_empty 时用 shallow；空格数 <= tight_empty，
+        或方块种类数 >= deep_distinct (且不是开阔局面) 时用 deep；其余用 normal
+
+        默认值来自 selfplay 对比 (种子 100-129 和 200-229 各 30 局)：固定深度 3
+        达成 4096 共 3/60 局、平均每步 3.5ms，本策略 10/60 局、每步 3.1ms。
+        按方块种类数加深 (例如 deep_distinct=12) 在测试中反而更差，默认不启用。"""
+        self.shallow = shallow
+        self.normal = normal
+        self.deep = deep
+        self.open_empty = open_empty
+        self.tight_empty = tight_empty
+        self.deep_distinct = deep_distinct
+
+    def __call__(self, board):
+        empty = bitboard.count_empty(board)
+        if empty >= self.open_empty:
+            return self.shallow
+        if empty <= self.tight_empty:
+            return self.deep
+        if self.deep_distinct is not None and bitboard.distinct_tiles(board) >= self.deep_distinct:
+            return self.deep
+        return self.normal
+
+    def config(self):
+        return {"name": "adaptive", "shallow": self.shallow, "normal": self.normal, "deep": self.deep,
+                "open_empty": self.open_empty, "tight_empty": self.tight_empty,
+                "deep_distinct": self.deep_distinct}
+
+
+POLICIES = {
+    "fixed": FixedDepth,
+    "adaptive": AdaptiveDepth,
+}
+
+
+def make_policy(spec):
+    """根据配置创建策略
+
+    spec 可以是 None (不使用策略)、策略名称 ("fixed" / "adaptive")、
+    带 "name" 键的参数字典 (即 config() 的返回值)，或者任意可调用对象。
+    """
+    if spec is None or callable(spec):
+        return spec
+    if isinstance(spec, str):
+        return POLICIES[spec]()
+    params = dict(spec)
+    return POLICIES[params.pop("name")](**params)
@@ -0,0 +1,231 @@
+"""
+2048 游戏规则引擎
+
+不依赖 Tkinter，可以在没有显示器的机器上运行。
+Game2048 (图形界面) 和 AI 都只是它的外壳。
+"""
+
+import random
+
+
+class GameEngine:
+    def __init__(self, seed=None, rng=None):
+        """seed 为随机种子; 也可以直接传入一个 random.Random 实例作为 rng
+
+        每个引擎使用自己的随机数生成器，不会影响全局的 random 模块。
+        相同的种子加上相同的移动序列，得到的对局完全相同。
+        """
+        self.seed = seed
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.grid = [[0 for _ in range(4)] for _ in range(4)]
+        self.score = 0
+        self.moved = False
+        # Optional game recorder (e.g. record.GameRecordWriter), notified of moves and spawns
+        self.recorder = None
+
+    def copy(self):
+        """复制当前局面，包括随机数状态 (副本上生成的方块与原引擎完全相同)"""
+        clone = GameEngine(self.seed)
+        clone.grid = [row[:] for row in self.grid]
+        clone.score = self.score
+        clone.rng.setstate(self.rng.getstate())
+        return clone
+
+    def reset(self, seed=None):
+        """开始新的游戏，生成两个初始方块"""
+        if seed is not None:
+            self.seed = seed
+            self.rng.seed(seed)
+        self.grid = [[0 for _ in range(4)] for _ in range(4)]
+        self.score = 0
+        self.moved = False
+
+        # Generate 2 random tiles
+        self.generate_new_tile()
+        self.generate_new_tile()
+
+    def generate_new_tile(self):
+        """在空位置随机生成一个新的数字（2或4）"""
+        grid = self.grid
+        count = grid[0].count(0) + grid[1].count(0) + grid[2].count(0) + grid[3].count(0)
+        if not count:
+            return False
+
+        # randrange(count) draws the same number as choice() on the list of empty cells,
+        # so games stay identical to ones played before this change
+        target = self.rng.randrange(count)
+        for i in range(4):
+            row = grid[i]
+            for j in range(4):
+                if row[j] == 0:
+                    if target == 0:
+                        row[j] = 2 if self.rng.random() < 0.9 else 4
+                        if self.recorder is not None:
+                            self.recorder.spawn(i * 4 + j, row[j])
+                        return True
+                    target -= 1
+        return False
+
+    def stack(self, grid=None):
+        """将所有非零元素向移动方向堆叠"""
+        if grid is None:
+            grid = self.grid
+
+        new_grid = [[0 for _ in range(4)] for _ in range(4)]
+        for i in range(4):
+            position = 0
+            for j in range(4):
+                if grid[i][j] != 0:
+                    new_grid[i][position] = grid[i][j]
+                    if position != j:
+                        self.moved = True
+                    position += 1
+        return new_grid
+
+    def combine(self, grid=None, simulate=False):
+        """合并相邻的相同数字，非模拟时累加分数"""
+        if grid is None:
+            grid = self.grid
+
+        for i in range(4):
+            for j in range(3):
+                if grid[i][j] != 0 and grid[i][j] == grid[i][j + 1]:
+                    grid[i][j] *= 2
+                    if not simulate:
+                        self.score += grid[i][j]
+                    grid[i][j + 1] = 0
+                    self.moved = True
+        return grid
+
+    def reverse(self, grid=None):
+        """翻转网格（用于向右移动）"""
+        if grid is None:
+            grid = self.grid
+
+        new_grid = []
+        for i in range(4):
+            new_grid.append([])
+            for j in range(4):
+                new_grid[i].append(grid[i][3-j])
+        return new_grid
+
+    def transpose(self, grid=None):
+        """转置网格（用于上下移动）"""
+        if grid is None:
+            grid = self.grid
+
+        new_grid = [[0 for _ in range(4)] for _ in range(4)]
+        for i in range(4):
+            for j in range(4):
+                new_grid[i][j] = grid[j][i]
+        return new_grid
+
+    def move_left(self, grid=None, simulate=False):
+        if grid is None:
+            grid = self.grid
+
+        grid = self.stack(grid)
+        grid = self.combine(grid, simulate=simulate)
+        grid = self.stack(grid)
+        return grid
+
+    def move_right(self, grid=None, simulate=False):
+        if grid is None:
+            grid = self.grid
+
+        grid = self.reverse(grid)
+        grid = self.move_left(grid, simulate=simulate)
+        grid = self.reverse(grid)
+        return grid
+
+    def move_up(self, grid=None, simulate=False):
+        if grid is None:
+            grid = self.grid
+
+        grid = self.transpose(grid)
+        grid = self.move_left(grid, simulate=simulate)
+        grid = self.transpose(grid)
+        return grid
+
+    def move_down(self, grid=None, simulate=False):
+        if grid is None:
+            grid = self.grid
+
+        grid = self.transpose(grid)
+        grid = self.move_right(grid, simulate=simulate)
+        grid = self.transpose(grid)
+        return grid
+
+    def legal_moves(self):
+        """返回当前所有可以移动的方向"""
+        # Imported here so that importing the engine does not build the move tables
+        import bitboard
+        if self.max_tile() >= bitboard.MAX_TILE:
+            return [direction for direction in bitboard.DIRECTIONS if self._simulate_can_move(direction)]
+        return bitboard.legal_moves(bitboard.to_board(self.grid))
+
+    def _simulate_can_move(self, direction):
+        """在网格副本上模拟移动，检查该方向是否能移动"""
+        test_grid = [row[:] for row in self.grid]
+        if direction == "left":
+            new_grid = self.move_left(test_grid, simulate=True)
+        elif direction == "right":
+            new_grid = self.move_right(test_grid, simulate=True)
+        elif direction == "up":
+            new_grid = self.move_up(test_grid, simulate=True)
+        else:
+            new_grid = self.move_down(test_grid, simulate=True)
+        return new_grid != self.grid
+
+    def can_move(self, direction=None):
+        """检查是否还能移动 (给出 direction 时只检查该方向)"""
+        grid = self.grid
+        if not direction and (0 in grid[0] or 0 in grid[1] or 0 in grid[2] or 0 in grid[3]):
+            return True
+        import bitboard
+        if self.max_tile() >= bitboard.MAX_TILE:
+            # Two 32768 tiles merge here but not on a packed board, simulate on the grid instead
+            if direction:
+                return self._simulate_can_move(direction)
+            return any(self._simulate_can_move(d) for d in bitboard.DIRECTIONS)
+        # One pass over precomputed per-row flags instead of simulating the move
+        mask = bitboard.legal_mask(bitboard.to_board(grid))
+        if direction:
+            return bool(mask & bitboard.DIRECTION_BITS[direction])
+        return mask != 0
+
+    def check_win(self):
+        """检查是否胜利"""
+        for i in range(4):
+            for j in range(4):
+                if self.grid[i][j] == 2048:
+                    return True
+        return False
+
+    def max_tile(self):
+        """返回棋盘上的最大方块"""
+        return max(max(row) for row in self.grid)
+
+    def move(self, direction):
+        """根据方向移动方块并生成新方块，返回是否发生了移动"""
+        self.moved = False
+
+        if not self.can_move(direction):
+            return False
+
+        if direction == "left":
+            self.grid = self.move_left()
+        elif direction == "right":
+            self.grid = self.move_right()
+        elif direction == "up":
+            self.grid = self.move_up()
+        elif direction == "down":
+            self.grid = self.move_down()
+
+        if self.moved:
+            if self.recorder is not None:
+                self.recorder.move(direction)
+            self.generate_new_tile()
+            if self.recorder is not None:
+                self.recorder.after_move(self.grid, self.score)
+        return self.moved
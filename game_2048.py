@@ -1,11 +1,43 @@
+import argparse
+import time
 import tkinter as tk
-import random
 import colors as c
 from tkinter import messagebox
+import bitboard
+from engine import GameEngine
+from history import History
+
+# Label config per tile value, built once and reused for every redraw
+_cell_config_cache = {}
+
+
+def cell_config(value):
+    """返回某个数值对应的格子样式 (文字、颜色、字体)"""
+    config = _cell_config_cache.get(value)
+    if config is None:
+        if value == 0:
+            config = {"text": "", "bg": c.EMPTY_CELL_COLOR}
+        else:
+            font_size = 24
+            if value > 512:
+                font_size = 18
+            if value > 1024:
+                font_size = 16
+            config = {
+                "text": str(value),
+                "bg": c.CELL_COLORS.get(value, c.CELL_COLORS[8192]),
+                "fg": c.CELL_NUMBER_COLORS.get(value, c.CELL_NUMBER_COLORS[8192]),
+                "font": ("Microsoft Yahei", font_size, "bold"),
+            }
+        _cell_config_cache[value] = config
+    return config
+
 
 class Game2048:
-    def __init__(self, master):
+    def __init__(self, master, engine=None, seed=None, history_depth=1000):
         self.master = master
+        # A fixed seed makes the spawned tiles reproducible
+        self.engine = engine if engine is not None else GameEngine(seed=seed)
         self.master.title("jasmiana's 2048")
         self.master.geometry("400x600")
         self.master.resizable(0, 0)
@@ -54,6 +86,15 @@ class Game2048:
             state=tk.DISABLED
         )
         self.undo_button.grid(row=0, column=1, padx=5)
+
+        self.redo_button = tk.Button(
+            self.button_frame,
+            text="重做",
+            font=("Microsoft Yahei", 12),
+            command=self.redo_move,
+            state=tk.DISABLED
+        )
+        self.redo_button.grid(row=0, column=2, padx=5)
         
         self.instruction_label = tk.Label(
             self.master,
@@ -63,6 +104,15 @@ class Game2048:
             fg=c.CELL_NUMBER_COLORS[8]
         )
         self.instruction_label.pack(pady=5)
+
+        self.render_label = tk.Label(
+            self.master,
+            text="",
+            font=("Microsoft Yahei", 9),
+            bg=c.GRID_COLOR,
+            fg=c.CELL_NUMBER_COLORS[8]
+        )
+        self.render_label.pack()
         
         self.cells = []
         for i in range(4):
@@ -87,10 +137,19 @@ class Game2048:
                 cell_number.place(relx=0.5, rely=0.5, anchor="center")
                 row.append(cell_number)
             self.cells.append(row)
+
+        # Value currently drawn in each cell (None = unknown, redraw it)
+        self.shown = [[None] * 4 for _ in range(4)]
+        # Render statistics: frames that changed something and cells reconfigured
+        self.frames = 0
+        self.cell_updates = 0
+        self._rate_start = time.perf_counter()
+        self._rate_frames = 0
+        self._rate_cells = 0
             
-        self.grid = [[0 for _ in range(4)] for _ in range(4)]
-        self.score = 0
-        self.history = []
+        # Undo/redo keeps at most history_depth packed boards
+        self.history_depth = history_depth
+        self.history = History(self.history_depth)
         
         self.master.bind("<Left>", lambda event: self.move("left"))
         self.master.bind("<Right>", lambda event: self.move("right"))
@@ -109,67 +168,109 @@ class Game2048:
     def new_game(self):
         """开始新的游戏"""
         # Reset
-        self.grid = [[0 for _ in range(4)] for _ in range(4)]
-        self.score = 0
+        self.engine.reset()
         self.score_value.config(text="0")
-        self.history = []
-        self.undo_button.config(state=tk.DISABLED)
-        
-        # Generate 2 random tiles
-        self.generate_new_tile()
-        self.generate_new_tile()
+        self.history.clear()
+        self.update_history_buttons()
+        self.end_flag = False
         
         self.update_display()
     
     def undo_move(self):
         """撤回上一步操作"""
-        if self.history:
-            last_state = self.history.pop()
-            self.grid = last_state["grid"]
-            self.score = last_state["score"]
-            self.score_value.config(text=str(self.score))
-            self.update_display()
-            
-            if not self.history:
-                self.undo_button.config(state=tk.DISABLED)
+        state = self.history.undo(self.history_board(), self.score)
+        if state is not None:
+            self.restore_state(*state)
+
+    def redo_move(self):
+        """重做被撤回的操作"""
+        state = self.history.redo(self.history_board(), self.score)
+        if state is not None:
+            self.restore_state(*state)
+
+    def history_board(self):
+        """当前局面在撤回历史中的形式: 压缩棋盘，有压缩棋盘放不下的方块时为网格的副本"""
+        if self.engine.max_tile() > bitboard.MAX_TILE:
+            return [row[:] for row in self.grid]
+        return bitboard.to_board(self.grid)
+
+    def restore_state(self, board, score):
+        """恢复到指定的局面和分数"""
+        self.grid = [row[:] for row in board] if isinstance(board, list) else bitboard.to_grid(board)
+        self.score = score
+        self.score_value.config(text=str(self.score))
+        self.update_display()
+        self.update_history_buttons()
+
+    def update_history_buttons(self):
+        """根据历史记录更新撤回/重做按钮的状态"""
+        self.undo_button.config(state=tk.NORMAL if self.history.can_undo() else tk.DISABLED)
+        self.redo_button.config(state=tk.NORMAL if self.history.can_redo() else tk.DISABLED)
         
+    @property
+    def grid(self):
+        return self.engine.grid
+
+    @grid.setter
+    def grid(self, value):
+        self.engine.grid = value
+
+    @property
+    def score(self):
+        return self.engine.score
+
+    @score.setter
+    def score(self, value):
+        self.engine.score = value
+
     def generate_new_tile(self):
         """在空位置随机生成一个新的数字（2或4）"""
-        empty_cells = []
-        for i in range(4):
-            for j in range(4):
-                if self.grid[i][j] == 0:
-                    empty_cells.append((i, j))
-        
-        if empty_cells:
-            i, j = random.choice(empty_cells)
-            self.grid[i][j] = 2 if random.random() < 0.9 else 4
-            return True
-        return False
+        return self.engine.generate_new_tile()
+
+    def can_move(self, direction=None):
+        """检查是否还能移动"""
+        return self.engine.can_move(direction)
+
+    def check_win(self):
+        """检查是否胜利"""
+        return self.engine.check_win()
     
     def update_display(self):
-        """更新界面显示"""
+        """更新界面显示 (只重新配置数值发生变化的格子)"""
+        changed = 0
         for i in range(4):
+            shown_row = self.shown[i]
+            grid_row = self.grid[i]
             for j in range(4):
-                value = self.grid[i][j]
-                if value == 0:
-                    self.cells[i][j].config(
-                        text="",
-                        bg=c.EMPTY_CELL_COLOR
-                    )
-                else:
-                    self.cells[i][j].config(bg=c.CELL_COLORS.get(value, c.CELL_COLORS[8192]))
-                    font_size = 24
-                    if value > 512:
-                        font_size = 18
-                    if value > 1024:
-                        font_size = 16
-                    
-                    self.cells[i][j].config(
-                        text=str(value),
-                        fg=c.CELL_NUMBER_COLORS.get(value, c.CELL_NUMBER_COLORS[8192]),
-                        font=("Microsoft Yahei", font_size, "bold")
-                    )
+                value = grid_row[j]
+                if shown_row[j] != value:
+                    self.cells[i][j].config(**cell_config(value))
+                    shown_row[j] = value
+                    changed += 1
+
+        if changed:
+            self.frames += 1
+            self.cell_updates += changed
+            self._update_render_rate(changed)
+
+    def invalidate_cell(self, i, j):
+        """标记某个格子需要重绘 (例如动画直接修改了它的样式)"""
+        self.shown[i][j] = None
+
+    def _update_render_rate(self, changed):
+        """统计每秒刷新次数和每次刷新更新的格子数"""
+        self._rate_frames += 1
+        self._rate_cells += changed
+        now = time.perf_counter()
+        elapsed = now - self._rate_start
+        if elapsed >= 1.0:
+            self.render_label.config(
+                text=f"刷新 {self._rate_frames / elapsed:.1f} 次/秒  "
+                     f"每次更新 {self._rate_cells / self._rate_frames:.1f} 格"
+            )
+            self._rate_start = now
+            self._rate_frames = 0
+            self._rate_cells = 0
     
     def animate_move(self, from_pos, to_pos):
         """平滑移动动画"""
@@ -187,6 +288,8 @@ class Game2048:
                 cell.place(x=cell.winfo_x() + x_offset, y=cell.winfo_y() + y_offset)
                 self.master.after(50, move_animation, step + 1)
             else:
+                self.invalidate_cell(from_x, from_y)
+                self.invalidate_cell(to_x, to_y)
                 self.update_display()
         
         move_animation(0)
@@ -205,150 +308,11 @@ class Game2048:
         def shrink():
             # Restore original size
             cell.place(relwidth=1, relheight=1)
+            self.invalidate_cell(x, y)
             self.update_display()
 
         enlarge()
     
-    def stack(self, grid=None):
-        """将所有非零元素向移动方向堆叠"""
-        if grid is None:
-            grid = self.grid
-            
-        new_grid = [[0 for _ in range(4)] for _ in range(4)]
-        for i in range(4):
-            position = 0
-            for j in range(4):
-                if grid[i][j] != 0:
-                    new_grid[i][position] = grid[i][j]
-                    if position != j:
-                        self.moved = True
-                    position += 1
-        return new_grid
-
-    def combine(self, grid=None, simulate=False):
-        if grid is None:
-            grid = self.grid
-
-        for i in range(4):
-            for j in range(3):
-                if grid[i][j] != 0 and grid[i][j] == grid[i][j + 1]:
-                    if not simulate:
-                        self.score += grid[i][j]
-                        self.score_value.config(text=str(self.score))
-                    grid[i][j] *= 2
-                    grid[i][j + 1] = 0
-                    self.moved = True
-        return grid
-
-    def reverse(self, grid=None):
-        """翻转网格（用于向右移动）"""
-        if grid is None:
-            grid = self.grid
-            
-        new_grid = []
-        for i in range(4):
-            new_grid.append([])
-            for j in range(4):
-                new_grid[i].append(grid[i][3-j])
-        return new_grid
-    
-    def transpose(self, grid=None):
-        """转置网格（用于上下移动）"""
-        if grid is None:
-            grid = self.grid
-            
-        new_grid = [[0 for _ in range(4)] for _ in range(4)]
-        for i in range(4):
-            for j in range(4):
-                new_grid[i][j] = grid[j][i]
-        return new_grid
-
-    def move_left(self, grid=None, simulate=False):
-        if grid is None:
-            grid = self.grid
-
-        grid = self.stack(grid)
-        grid = self.combine(grid, simulate=simulate)
-        grid = self.stack(grid)
-        return grid
-
-    def move_right(self, grid=None, simulate=False):
-        if grid is None:
-            grid = self.grid
-
-        grid = self.reverse(grid)
-        grid = self.move_left(grid, simulate=simulate)
-        grid = self.reverse(grid)
-        return grid
-
-    def move_up(self, grid=None, simulate=False):
-        if grid is None:
-            grid = self.grid
-
-        grid = self.transpose(grid)
-        grid = self.move_left(grid, simulate=simulate)
-        grid = self.transpose(grid)
-        return grid
-
-    def move_down(self, grid=None, simulate=False):
-        if grid is None:
-            grid = self.grid
-
-        grid = self.transpose(grid)
-        grid = self.move_right(grid, simulate=simulate)
-        grid = self.transpose(grid)
-        return grid
-
-    def can_move(self, direction=None):
-        """检查是否还能移动"""
-        # Empty -> Could move
-        has_empty = False
-        for i in range(4):
-            for j in range(4):
-                if self.grid[i][j] == 0:
-                    has_empty = True
-        
-        # Adjacent, same number
-        has_same_neighbors = False
-        # Check horizontally
-        for i in range(4):
-            for j in range(3):
-                if self.grid[i][j] == self.grid[i][j+1] and self.grid[i][j] != 0:
-                    has_same_neighbors = True
-        
-        # Check vertically
-        for i in range(3):
-            for j in range(4):
-                if self.grid[i][j] == self.grid[i+1][j] and self.grid[i][j] != 0:
-                    has_same_neighbors = True
-        
-        # Movable through specific direction
-        if direction:
-            # Copy a grid for testing
-            test_grid = [row[:] for row in self.grid]
-            
-            if direction == "left":
-                new_grid = self.move_left(test_grid)
-            elif direction == "right":
-                new_grid = self.move_right(test_grid)
-            elif direction == "up":
-                new_grid = self.move_up(test_grid)
-            elif direction == "down":
-                new_grid = self.move_down(test_grid)
-                
-            # Changes occurred -> Could move
-            return new_grid != self.grid
-            
-        return has_empty or has_same_neighbors
-    
-    def check_win(self):
-        """检查是否胜利"""
-        for i in range(4):
-            for j in range(4):
-                if self.grid[i][j] == 2048:
-                    return True
-        return False
-    
     '''
     def animate_move(self, from_pos, to_pos):
         """平滑移动动画"""
@@ -373,32 +337,19 @@ class Game2048:
         move_animation(0)
     '''
     
-    def move(self, direction):
-        """根据方向移动方块"""
-        self.moved = False
-        
+    def move(self, direction, render=True):
+        """根据方向移动方块，render=False 时不刷新棋盘 (由调用方统一刷新)"""
         if not self.can_move(direction):
             return
             
         # Save current state for undo
-        self.history.append({
-            "grid": [row[:] for row in self.grid],
-            "score": self.score
-        })
-        self.undo_button.config(state=tk.NORMAL)
-            
-        if direction == "left":
-            self.grid = self.move_left()
-        elif direction == "right":
-            self.grid = self.move_right()
-        elif direction == "up":
-            self.grid = self.move_up()
-        elif direction == "down":
-            self.grid = self.move_down()
+        self.history.push(self.history_board(), self.score)
+        self.update_history_buttons()
         
-        if self.moved:
-            self.generate_new_tile()
-            self.update_display()
+        if self.engine.move(direction):
+            self.score_value.config(text=str(self.score))
+            if render:
+                self.update_display()
 
             if self.check_win() and self.end_flag == False:
                 self.end_flag = True
@@ -412,7 +363,14 @@ class Game2048:
                 messagebox.showinfo("游戏结束", f"游戏结束！最终分数：{self.score}")
 
 
+def build_parser():
+    parser = argparse.ArgumentParser(description="jasmiana's 2048")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子 (相同种子和相同操作得到相同的对局)")
+    return parser
+
+
 if __name__ == "__main__":
+    args = build_parser().parse_args()
     root = tk.Tk()
-    game = Game2048(root)
+    game = Game2048(root, seed=args.seed)
     root.mainloop() 
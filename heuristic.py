@@ -0,0 +1,181 @@
+"""
+查表式启发评估函数
+
+把 AI2048.evaluate_position 的各项指标拆成按行、按列的贡献:
+- 位置权重、空格数量: 只与所在行有关
+- 可合并对数、平滑度、单调性: 行和列各算一次，计算方式完全相同
+
+启动时对全部 65536 种行预先计算好这些贡献，评估一个棋盘只需要
+4 次行查表 + 4 次列查表，再加上最大方块项 (取 4 行最大值中的最大者)。
+这些表第一次构建后按权重缓存在磁盘上 (见 tablecache.py)。
+在默认权重下结果与 evaluate_position 完全相等。
+
+bounds() 给出方块总和在某个范围内的任意棋盘的评估值上下界，供 Star1 剪枝使用。
+每张表都满足 t[r] 介于 t[0] + 最小斜率*行和 与 t[0] + 最大斜率*行和 之间，
+而各行 (各列) 的行和加起来正好是方块总和，所以界只取决于方块总和。
+"""
+
+import hashlib
+import json
+
+import bitboard
+from tablecache import load_tables
+
+DEFAULT_WEIGHT_MATRIX = [
+    [2 ** 3, 2 ** 2, 2 ** 1, 2 ** 0],
+    [2 ** 4, 2 ** 5, 2 ** 6, 2 ** 7],
+    [2 ** 11, 2 ** 10, 2 ** 9, 2 ** 8],
+    [2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15],
+]
+
+# Searcher/TableHeuristic arguments that make up a weight configuration (see tuner.py)
+WEIGHT_KEYS = ("weight_matrix", "empty_weight", "merge_weight", "smoothness_weight",
+               "monotonicity_weight", "max_tile_weight")
+
+# Written by tuner.py, loaded by agent.py at startup when it exists
+DEFAULT_WEIGHTS_FILE = "weights.json"
+
+
+def load_weights(path):
+    """读取权重配置文件，返回可直接传给 Searcher 的参数字典"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {key: data[key] for key in WEIGHT_KEYS if key in data}
+
+
+def save_weights(path, weights, **extra):
+    """保存权重配置，extra 中的内容 (如调参结果) 一并写入，读取时会被忽略"""
+    data = {key: weights[key] for key in WEIGHT_KEYS if key in weights}
+    data.update(extra)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def _line_features(values):
+    """计算一行 (或一列) 的 (空格数, 可合并对数, 平滑度, 单调性)"""
+    empty = values.count(0)
+
+    merges = 0
+    smoothness = 0
+    for j in range(3):
+        a, b = values[j], values[j + 1]
+        if a != 0 and a == b:
+            merges += 1
+        if a != 0 and b != 0:
+            smoothness -= abs(a - b)
+
+    # Empty cells count as -inf: non-zero tiles must be non-increasing and packed at the front
+    current = [x if x != 0 else float('-inf') for x in values]
+    if all(current[j] >= current[j + 1] for j in range(3)):
+        monotonicity = sum(values)
+    else:
+        monotonicity = 0
+
+    return empty, merges, smoothness, monotonicity
+
+
+def _bound_params(row_tables, col_table):
+    """bounds() 用的 (常数项, 最小斜率, 最大斜率)"""
+    row_sum = bitboard.ROW_SUM
+    row_slopes = []
+    for table in row_tables + [col_table]:
+        base = table[0]
+        slopes = [(table[r] - base) / row_sum[r] for r in range(1, 65536)]
+        row_slopes.append((min(slopes), max(slopes)))
+    col_low, col_high = row_slopes.pop()
+
+    bound_base = sum(table[0] for table in row_tables) + 4 * col_table[0]
+    # Row sums add up to the tile sum, so the steepest row slope bounds all four rows
+    slope_low = min(low for low, _ in row_slopes) + col_low
+    slope_high = max(high for _, high in row_slopes) + col_high
+    return [bound_base, slope_low, slope_high]
+
+
+# Bump when the tables built by TableHeuristic change, so stale disk caches are not used
+TABLE_VERSION = 1
+
+
+class TableHeuristic:
+    def __init__(self, weight_matrix=None, empty_weight=2000.0, merge_weight=800.0,
+                 smoothness_weight=100.0, monotonicity_weight=2.0, max_tile_weight=1.0, cache=True):
+        """cache 为 True 时查找表缓存在磁盘上 (见 tablecache.py)，临时试用的权重可以关掉"""
+        if weight_matrix is None:
+            weight_matrix = DEFAULT_WEIGHT_MATRIX
+        self.weight_matrix = [list(row) for row in weight_matrix]
+        self.empty_weight = empty_weight
+        self.merge_weight = merge_weight
+        self.smoothness_weight = smoothness_weight
+        self.monotonicity_weight = monotonicity_weight
+        self.max_tile_weight = max_tile_weight
+        self.cache = cache
+        self._load_tables()
+
+    def _load_tables(self):
+        if self.cache:
+            key = ("heuristic", TABLE_VERSION, self.weight_matrix, self.empty_weight, self.merge_weight,
+                   self.smoothness_weight, self.monotonicity_weight, self.max_tile_weight)
+            tables = load_tables("heuristic", key, self._build_tables)
+        else:
+            tables = [values for _, values in self._build_tables()]
+        self.row_tables = tables[:4]
+        self.col_table = tables[4]
+        self.row_max = tables[5]
+        self._bound_base, self._slope_low, self._slope_high = tables[6]
+        self.max_tile_term = [((1 << e) if e else 0) ** 2 * self.max_tile_weight for e in range(16)]
+
+    def _build_tables(self):
+        """构建查找表，返回 [(类型码, 列表)]，最后一张是 bounds() 用的三个参数"""
+        row_tables = [[0.0] * 65536 for _ in range(4)]
+        col_table = [0.0] * 65536
+        row_max = [0] * 65536
+
+        for row in range(65536):
+            exps = [(row >> (4 * j)) & 0xF for j in range(4)]
+            values = [1 << e if e else 0 for e in exps]
+            empty, merges, smoothness, monotonicity = _line_features(values)
+
+            shared = (merges * self.merge_weight +
+                      smoothness * self.smoothness_weight +
+                      monotonicity * self.monotonicity_weight)
+            col_table[row] = shared
+            for i in range(4):
+                position = sum(values[j] * self.weight_matrix[i][j] for j in range(4))
+                row_tables[i][row] = position * 1.0 + empty * self.empty_weight + shared
+            row_max[row] = max(exps)
+
+        bounds = _bound_params(row_tables, col_table)
+        return [("d", table) for table in row_tables] + [("d", col_table), ("B", row_max), ("d", bounds)]
+
+    def bounds(self, sum_low, sum_high):
+        """方块总和在 [sum_low, sum_high] 内的任意棋盘，其评估值的 (下界, 上界)"""
+        max_exp = min(max(sum_high, 1).bit_length() - 1, 15)
+        max_terms = self.max_tile_term[:max_exp + 1]
+        linear = [self._bound_base + self._slope_low * s for s in (sum_low, sum_high)]
+        linear += [self._bound_base + self._slope_high * s for s in (sum_low, sum_high)]
+        low = min(linear) + min(max_terms)
+        high = max(linear) + max(max_terms)
+        # Leave room for rounding in the slopes
+        return low - abs(low) * 1e-9 - 1.0, high + abs(high) * 1e-9 + 1.0
+
+    def fingerprint(self):
+        """评估函数的标识 (64 位整数)，权重相同时才相同，开局库用它检查是否匹配"""
+        # Weights read from JSON may be ints, the tables only see their float values
+        key = (TABLE_VERSION, [float(v) for row in self.weight_matrix for v in row],
+               float(self.empty_weight), float(self.merge_weight), float(self.smoothness_weight),
+               float(self.monotonicity_weight), float(self.max_tile_weight))
+        return int.from_bytes(hashlib.sha1(repr(key).encode("utf-8")).digest()[:8], "little")
+
+    def evaluate(self, board):
+        """评估压缩棋盘的局面分数"""
+        r0 = board & 0xFFFF
+        r1 = (board >> 16) & 0xFFFF
+        r2 = (board >> 32) & 0xFFFF
+        r3 = (board >> 48) & 0xFFFF
+        t = bitboard.transpose(board)
+        col = self.col_table
+        row_max = self.row_max
+        rows = self.row_tables
+        return (rows[0][r0] + rows[1][r1] + rows[2][r2] + rows[3][r3] +
+                col[t & 0xFFFF] + col[(t >> 16) & 0xFFFF] +
+                col[(t >> 32) & 0xFFFF] + col[(t >> 48) & 0xFFFF] +
+                self.max_tile_term[max(row_max[r0], row_max[r1], row_max[r2], row_max[r3])])
@@ -0,0 +1,96 @@
+"""
+紧凑的撤回/重做历史
+
+每个局面只存两个 64 位整数: 压缩棋盘 (bitboard 格式) 和分数，放在预先分配好的
+array 环形缓冲区里。容量有上限，满了以后覆盖最旧的记录，入栈出栈都是 O(1)。
+压缩棋盘放不下的局面 (有 65536 及以上的方块) 可以直接传入 4x4 网格，另外存放。
+"""
+
+from array import array
+
+
+class _Ring:
+    """固定容量的 (棋盘, 分数) 环形栈"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.boards = array("Q", bytes(8 * capacity))
+        self.scores = array("Q", bytes(8 * capacity))
+        # index -> grid, for boards too large to pack
+        self.grids = {}
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, board, score):
+        if self.capacity == 0:
+            return
+        index = (self.start + self.size) % self.capacity
+        if isinstance(board, int):
+            self.boards[index] = board
+            self.grids.pop(index, None)
+        else:
+            self.grids[index] = board
+        self.scores[index] = score
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            # Full: the oldest entry was just overwritten
+            self.start = (self.start + 1) % self.capacity
+
+    def pop(self):
+        if not self.size:
+            return None
+        self.size -= 1
+        index = (self.start + self.size) % self.capacity
+        board = self.grids.pop(index, None)
+        return self.boards[index] if board is None else board, self.scores[index]
+
+    def clear(self):
+        self.grids.clear()
+        self.start = 0
+        self.size = 0
+
+
+class History:
+    def __init__(self, depth=1000):
+        self.depth = depth
+        self._undo = _Ring(depth)
+        self._redo = _Ring(depth)
+
+    def __len__(self):
+        return len(self._undo)
+
+    def __bool__(self):
+        return bool(self._undo.size)
+
+    def can_undo(self):
+        return self._undo.size > 0
+
+    def can_redo(self):
+        return self._redo.size > 0
+
+    def push(self, board, score):
+        """记录移动之前的局面 (会清空重做记录)"""
+        self._undo.push(board, score)
+        self._redo.clear()
+
+    def undo(self, board, score):
+        """撤回一步: 传入当前局面，返回上一个局面 (棋盘, 分数)，没有时返回 None"""
+        state = self._undo.pop()
+        if state is not None:
+            self._redo.push(board, score)
+        return state
+
+    def redo(self, board, score):
+        """重做一步: 传入当前局面，返回撤回之前的局面，没有时返回 None"""
+        state = self._redo.pop()
+        if state is not None:
+            self._undo.push(board, score)
+        return state
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
@@ -0,0 +1,201 @@
+"""
+搜索统计 (可选)
+
+SearchStats 附加到 Searcher 上以后，每次 choose_move 都会生成一条统计记录:
+按类型 (Max/Chance) 和剩余深度统计的节点数、Chance 节点的平均分支数、
+评估函数和 simulate_move 的调用次数、置换表命中数、概率剪枝次数，以及各阶段用时。
+记录可以逐行写成 JSON (JSON Lines)，方便导入看板。
+
+实现方式是在搜索器实例上用带计数的包装函数临时替换 expectimax / star1 /
+evaluate_board / simulate_move，搜索结束后再删除。没有附加统计时搜索器上没有任何
+额外代码，热点路径的开销为零。sample_every 大于 1 时只统计每 N 步中的一步，
+其余步数几乎没有额外开销，适合在正式运行中一直开着。
+
+注意: 并行搜索时工作进程中的节点只计入总节点数，不按类型和深度统计。
+
+用法:
+    stats = SearchStats(output=open("stats.jsonl", "w"), sample_every=10)
+    stats.attach(searcher)
+    ...
+    stats.detach()
+"""
+
+import json
+import time
+
+import bitboard
+
+# Remaining depth never gets close to this, deeper nodes share the last slot
+MAX_TRACKED_DEPTH = 32
+
+
+class SearchStats:
+    def __init__(self, output=None, sample_every=1):
+        # output: text file the per-move records are written to as JSON lines (optional)
+        self.output = output
+        self.sample_every = max(1, sample_every)
+        self.searcher = None
+        self.moves = 0
+        self.records = []
+        self.keep_records = output is None
+        self.totals = self._empty_counters()
+        self.phase_times = {}
+
+    @staticmethod
+    def _empty_counters():
+        return {
+            "max_nodes": [0] * MAX_TRACKED_DEPTH,
+            "chance_nodes": [0] * MAX_TRACKED_DEPTH,
+            "chance_children": 0,
+            "evaluations": 0,
+            "simulations": 0,
+        }
+
+    def attach(self, searcher):
+        """开始统计该搜索器的每一步"""
+        self.detach()
+        self.searcher = searcher
+        inner = type(searcher).choose_move.__get__(searcher)
+
+        def choose_move(board):
+            self.moves += 1
+            if self.moves % self.sample_every:
+                return inner(board)
+            return self._measure(inner, board)
+
+        searcher.choose_move = choose_move
+
+    def detach(self):
+        """停止统计，搜索器恢复为原来的方法"""
+        searcher = self.searcher
+        if searcher is None:
+            return
+        for name in ("choose_move", "expectimax", "star1", "evaluate_board", "simulate_move"):
+            searcher.__dict__.pop(name, None)
+        self.searcher = None
+
+    def _install(self, searcher, counters):
+        """在搜索器实例上安装带计数的包装函数"""
+        cls = type(searcher)
+        expectimax = cls.expectimax.__get__(searcher)
+        star1 = cls.star1.__get__(searcher)
+        evaluate_board = cls.evaluate_board.__get__(searcher)
+        simulate_move = cls.simulate_move.__get__(searcher)
+        max_nodes = counters["max_nodes"]
+        chance_nodes = counters["chance_nodes"]
+        last = MAX_TRACKED_DEPTH - 1
+        count_empty = bitboard.count_empty
+
+        def count_node(board, depth, is_max):
+            if is_max:
+                max_nodes[min(depth, last)] += 1
+            else:
+                chance_nodes[min(depth, last)] += 1
+                if depth:
+                    counters["chance_children"] += count_empty(board)
+
+        def counted_expectimax(board, depth, is_max, prob=1.0):
+            count_node(board, depth, is_max)
+            return expectimax(board, depth, is_max, prob)
+
+        def counted_star1(board, depth, is_max, alpha=float('-inf'), beta=float('inf')):
+            count_node(board, depth, is_max)
+            return star1(board, depth, is_max, alpha, beta)
+
+        def counted_evaluate_board(board):
+            counters["evaluations"] += 1
+            return evaluate_board(board)
+
+        def counted_simulate_move(board, direction):
+            counters["simulations"] += 1
+            return simulate_move(board, direction)
+
+        searcher.expectimax = counted_expectimax
+        searcher.star1 = counted_star1
+        searcher.evaluate_board = counted_evaluate_board
+        searcher.simulate_move = counted_simulate_move
+
+    def _uninstall(self, searcher):
+        for name in ("expectimax", "star1", "evaluate_board", "simulate_move"):
+            searcher.__dict__.pop(name, None)
+
+    def _measure(self, inner, board):
+        searcher = self.searcher
+        counters = self._empty_counters()
+        table = searcher.transposition
+        hits, misses = table.hits, table.misses
+        nodes, cutoffs = searcher.nodes, searcher.cutoffs
+
+        self._install(searcher, counters)
+        start = time.perf_counter()
+        try:
+            direction = inner(board)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._uninstall(searcher)
+
+        record = {
+            "move": self.moves,
+            "direction": direction,
+            "depth": searcher.last_depth,
+            "time_ms": elapsed * 1000.0,
+            "nodes": searcher.nodes - nodes,
+            "max_nodes": _by_depth(counters["max_nodes"]),
+            "chance_nodes": _by_depth(counters["chance_nodes"]),
+            "branching": _branching(counters),
+            "evaluations": counters["evaluations"],
+            "simulations": counters["simulations"],
+            "cache_hits": table.hits - hits,
+            "cache_misses": table.misses - misses,
+            "cutoffs": searcher.cutoffs - cutoffs,
+        }
+        self._add_totals(counters)
+        self.add_phase("search", elapsed)
+        self.emit(record)
+        return direction
+
+    def _add_totals(self, counters):
+        totals = self.totals
+        for key in ("max_nodes", "chance_nodes"):
+            totals[key] = [a + b for a, b in zip(totals[key], counters[key])]
+        for key in ("chance_children", "evaluations", "simulations"):
+            totals[key] += counters[key]
+
+    def sampled(self):
+        """最近一次 choose_move 是否被统计；其他阶段也只在这些步上计时，才能和 "search" 比较"""
+        return self.moves > 0 and not self.moves % self.sample_every
+
+    def add_phase(self, name, seconds):
+        """累加某个阶段 (如 "search"、"apply"、"render") 的用时"""
+        self.phase_times[name] = self.phase_times.get(name, 0.0) + seconds
+
+    def emit(self, record):
+        """输出一条记录 (写入 output，或者没有 output 时保存在 records 中)"""
+        if self.output is not None:
+            self.output.write(json.dumps(record) + "\n")
+        if self.keep_records:
+            self.records.append(record)
+
+    def summary(self):
+        """所有被统计的步数的汇总"""
+        totals = self.totals
+        return {
+            "moves": self.moves,
+            "max_nodes": _by_depth(totals["max_nodes"]),
+            "chance_nodes": _by_depth(totals["chance_nodes"]),
+            "branching": _branching(totals),
+            "evaluations": totals["evaluations"],
+            "simulations": totals["simulations"],
+            "phase_ms": {name: seconds * 1000.0 for name, seconds in self.phase_times.items()},
+        }
+
+
+def _by_depth(counts):
+    """节点数列表 -> {剩余深度: 节点数} (省略为零的深度)"""
+    return {depth: count for depth, count in enumerate(counts) if count}
+
+
+def _branching(counters):
+    """Chance 节点的平均空格数 (每个空格有 2 和 4 两个子节点)"""
+    expanded = sum(counters["chance_nodes"][1:])
+    return counters["chance_children"] / expanded if expanded else 0.0
@@ -0,0 +1,281 @@
+"""
+N-tuple 网络评估函数
+
+每个 n-tuple 是棋盘上固定的几个格子，这几个格子的指数拼起来作为下标，
+到一张 16 ** n 项的权重表里取值。每个 tuple 在棋盘的 8 个对称变换上各取一次，
+局面的评估值就是所有取值之和。权重用 TD(0) 自我对弈学习，学到的是
+"移动之后 (生成新方块之前) 的局面还能得多少分"。
+
+可以作为 Searcher 的评估函数 (Searcher(evaluator="ntuple.bin"))，
+与 TableHeuristic 一样提供 evaluate(board) 和 bounds(sum_low, sum_high)。
+评估值不含已经得到的分数，所以 afterstate 为 True: 搜索在每条 Max 边上加上移动得分，
+在移动之后的局面上取评估值 (见 Searcher.evaluate_leaf)。
+
+文件格式 (小端序):
+- 文件头 12 字节: 魔数 b"2048NTN1"、版本号、tuple 数量
+- 每个 tuple 8 字节: 格子数 n，之后是 n 个格子编号 (行优先 0~15)，不足 7 个补 0
+- 之后依次是每个 tuple 的权重表，每项 float32
+
+读取时用 mmap 映射文件，权重表直接在映射上访问，不会复制进内存。
+
+用法:
+    python ntuple.py --games 20000 --output ntuple.bin
+    python selfplay.py --evaluator ntuple.bin
+"""
+
+import argparse
+import hashlib
+import mmap
+import random
+import struct
+import sys
+import time
+from array import array
+
+import bitboard
+
+MAGIC = b"2048NTN1"
+VERSION = 1
+
+HEADER = struct.Struct("<8sHH")
+TUPLE = struct.Struct("<B7s")
+
+# Straight lines and 2x2 squares; with the 8 symmetries they cover every
+# row, column and square of the board (cells numbered row-major, 0-15)
+DEFAULT_TUPLES = (
+    (0, 1, 2, 3),
+    (4, 5, 6, 7),
+    (0, 1, 4, 5),
+    (1, 2, 5, 6),
+    (5, 6, 9, 10),
+)
+
+
+def _compile(cells):
+    """把格子编号分成连续的段，返回 [(位移, 掩码, 在下标中的位置)]"""
+    runs = []
+    position = 0
+    for cell in cells:
+        if runs and runs[-1][0] + 4 * runs[-1][1] == 4 * cell and runs[-1][2] + 4 * runs[-1][1] == position:
+            shift, length, start = runs[-1]
+            runs[-1] = (shift, length + 1, start)
+        else:
+            runs.append((4 * cell, 1, position))
+        position += 4
+    return [(shift, (1 << (4 * length)) - 1, start) for shift, length, start in runs]
+
+
+class NTupleNetwork:
+    # Values are learned for boards right after a move, see Searcher.evaluate_leaf
+    afterstate = True
+
+    def __init__(self, tuples=DEFAULT_TUPLES, tables=None):
+        """tables 为每个 tuple 的权重表 (array 或 memoryview)，不给出时全部为 0"""
+        self.tuples = [tuple(cells) for cells in tuples]
+        if tables is None:
+            tables = [array("f", bytes(4 * 16 ** len(cells))) for cells in self.tuples]
+        self.tables = tables
+        self._runs = [_compile(cells) for cells in self.tuples]
+        self._bounds = None
+        self._mmap = None
+        self.path = None
+
+    @classmethod
+    def load(cls, path, writable=False):
+        """读取权重文件；默认只读映射，writable 为 True 时读进内存以便继续训练"""
+        with open(path, "rb") as f:
+            if writable:
+                buffer = f.read()
+            else:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是 n-tuple 权重文件")
+        tuples = []
+        offset = HEADER.size
+        for _ in range(count):
+            length, cells = TUPLE.unpack_from(buffer, offset)
+            tuples.append(tuple(cells[:length]))
+            offset += TUPLE.size
+
+        tables = []
+        if writable:
+            for cells in tuples:
+                table = array("f")
+                size = 4 * 16 ** len(cells)
+                table.frombytes(buffer[offset:offset + size])
+                tables.append(table)
+                offset += size
+        else:
+            floats = memoryview(buffer)[offset:].cast("f")
+            start = 0
+            for cells in tuples:
+                size = 16 ** len(cells)
+                tables.append(floats[start:start + size])
+                start += size
+
+        network = cls(tuples, tables)
+        network.path = path
+        if not writable:
+            network._mmap = buffer
+        return network
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.tuples)))
+            for cells in self.tuples:
+                f.write(TUPLE.pack(len(cells), bytes(cells)))
+            for table in self.tables:
+                f.write(table.tobytes() if isinstance(table, array) else bytes(table))
+
+    def close(self):
+        """释放只读映射"""
+        if self._mmap is not None:
+            for table in self.tables:
+                table.release()
+            self.tables = None
+            self._mmap.close()
+            self._mmap = None
+
+    def __getstate__(self):
+        # Memory-mapped networks are re-opened from their file instead of being copied
+        if self._mmap is not None:
+            return {"path": self.path}
+        state = dict(self.__dict__)
+        state["_mmap"] = None
+        return state
+
+    def __setstate__(self, state):
+        if "tables" not in state:
+            state = NTupleNetwork.load(state["path"]).__dict__
+        self.__dict__.update(state)
+
+    def features(self):
+        """每个局面的取值个数 (tuple 数 * 8 个对称变换)"""
+        return 8 * len(self.tuples)
+
+    def evaluate(self, board):
+        """评估压缩棋盘 (移动之后、生成新方块之前的局面)"""
+        value = 0.0
+        for b in bitboard.symmetries(board):
+            for table, runs in zip(self.tables, self._runs):
+                index = 0
+                for shift, mask, start in runs:
+                    index |= ((b >> shift) & mask) << start
+                value += table[index]
+        return value
+
+    def update(self, board, delta):
+        """把局面用到的每个权重加上 delta"""
+        for b in bitboard.symmetries(board):
+            for table, runs in zip(self.tables, self._runs):
+                index = 0
+                for shift, mask, start in runs:
+                    index |= ((b >> shift) & mask) << start
+                table[index] += delta
+        self._bounds = None
+
+    def bounds(self, sum_low, sum_high):
+        """任意棋盘评估值的 (下界, 上界)，与方块总和无关"""
+        if self._bounds is None:
+            low = 8 * sum(min(table) for table in self.tables)
+            high = 8 * sum(max(table) for table in self.tables)
+            # Leave room for float32 rounding in the sums
+            self._bounds = (low - abs(low) * 1e-6 - 1.0, high + abs(high) * 1e-6 + 1.0)
+        return self._bounds
+
+    def fingerprint(self):
+        """评估函数的标识 (64 位整数)，tuple 和权重都相同时才相同，开局库用它检查是否匹配"""
+        digest = hashlib.sha1(repr(self.tuples).encode("utf-8"))
+        for table in self.tables:
+            digest.update(table.tobytes())
+        return int.from_bytes(digest.digest()[:8], "little")
+
+
+def spawn_tile(board, rng):
+    """在随机空格生成 2 (90%) 或 4，没有空格时原样返回"""
+    shifts = bitboard.empty_shifts(board)
+    if not shifts:
+        return board
+    shift = shifts[rng.randrange(len(shifts))]
+    return board | ((1 if rng.random() < 0.9 else 2) << shift)
+
+
+def train_game(network, rng, alpha):
+    """用 TD(0) 自我对弈一局并更新权重，返回 (分数, 最大方块)
+
+    每步选择 "得分 + 移动后局面的评估值" 最大的方向，然后把上一步移动后局面的
+    评估值向 "本步得分 + 本步移动后局面的评估值" 靠拢。
+    """
+    step = alpha / network.features()
+    board = spawn_tile(spawn_tile(0, rng), rng)
+    score = 0
+    previous = None
+    while True:
+        best_value = None
+        for direction in bitboard.DIRECTIONS:
+            after = bitboard.MOVES[direction](board)
+            if after == board:
+                continue
+            reward = bitboard.score_gain(board, direction)
+            value = reward + network.evaluate(after)
+            if best_value is None or value > best_value:
+                best_value, best_after, best_reward = value, after, reward
+        if best_value is None:
+            break
+        if previous is not None:
+            network.update(previous, step * (best_value - network.evaluate(previous)))
+        previous = best_after
+        score += best_reward
+        board = spawn_tile(best_after, rng)
+
+    # Nothing more can be scored after the last move
+    if previous is not None:
+        network.update(previous, -step * network.evaluate(previous))
+    return score, 1 << bitboard.max_exponent(board)
+
+
+def train(network, games, seed=0, alpha=0.1, report_every=1000, log=None):
+    """训练 games 局，每 report_every 局打印一次平均分数和达成 2048 的比例"""
+    rng = random.Random(seed)
+    scores = []
+    wins = 0
+    start = time.perf_counter()
+    for game in range(1, games + 1):
+        score, max_tile = train_game(network, rng, alpha)
+        scores.append(score)
+        wins += max_tile >= 2048
+        if log is not None and (game % report_every == 0 or game == games):
+            print(f"第 {game} 局: 平均分数 {sum(scores) / len(scores):.0f}  "
+                  f"达成 2048: {wins / len(scores) * 100:.1f}%  "
+                  f"用时 {time.perf_counter() - start:.0f}s", file=log, flush=True)
+            scores = []
+            wins = 0
+    return network
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="用 TD(0) 自我对弈训练 n-tuple 网络评估函数")
+    parser.add_argument("--games", type=int, default=10000, help="训练对局数量")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--alpha", type=float, default=0.1, help="学习率 (平均分给每个权重)")
+    parser.add_argument("--report-every", type=int, default=1000, help="每隔多少局打印一次进度")
+    parser.add_argument("--resume", default=None, help="从已有的权重文件继续训练")
+    parser.add_argument("--output", default="ntuple.bin", help="权重文件输出路径")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    network = NTupleNetwork.load(args.resume, writable=True) if args.resume else NTupleNetwork()
+    try:
+        train(network, args.games, args.seed, args.alpha, args.report_every, log=sys.stdout)
+    finally:
+        # Keep what was learned so far even when interrupted
+        network.save(args.output)
+        print(f"已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
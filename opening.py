@@ -0,0 +1,223 @@
+"""
+开局库
+
+离线预先搜索开局阶段会出现的局面，把最佳移动方向和它的期望值存成文件，
+对局时 Searcher 先查库，查不到才搜索。开局局面空格最多，Chance 节点的分支也最多，
+而不同对局的开局又高度重复，所以这部分最值得预先算好。
+
+构建方法: 从所有可能的初始局面 (两个方块) 出发，每个局面用 Searcher 搜出最佳移动，
+再枚举之后所有可能生成的新方块，得到下一步的局面，一共展开前 N 步。
+使用 n-tuple 网络这样对称的评估函数时，8 个对称变换视为同一个局面，库中只存最小的
+那个 (见 bitboard.canonical)；默认评估函数的位置权重偏向右下角，不对称，只能按原样存储。
+
+文件格式 (小端序):
+- 文件头 32 字节: 魔数 b"2048OPN1"、版本号、构建时的搜索深度、步数 N、是否按对称合并、条目数、
+  评估函数的标识 (Searcher.evaluator_fingerprint，0 表示未知)
+- 之后是按棋盘升序排列的条目，每条 16 字节: 压缩棋盘 (uint64)、期望值 (float32)、
+  方向 (DIRECTIONS 中的下标)，补齐 3 字节
+
+读取时用 mmap 映射文件并二分查找，每次查询 O(log n)，不会把整个文件读进内存。
+Searcher 加载开局库时检查评估函数的标识和搜索深度，与自己不符就拒绝使用。
+
+用法:
+    python opening.py --moves 3 --depth 3 --workers 4 --output opening.book
+    python selfplay.py --book opening.book
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bitboard
+from heuristic import load_weights
+
+# search.py imports this module for OpeningBook, so the functions below import search when called
+
+MAGIC = b"2048OPN1"
+VERSION = 2
+
+HEADER = struct.Struct("<8sHHHHQQ")
+ENTRY = struct.Struct("<QfB3x")
+KEY = struct.Struct("<Q")
+
+
+class OpeningBook:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self._mmap, 0)[:2]
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} 不是开局库文件 (或是旧版本的开局库，需要重新生成)")
+        (_, _, self.depth, self.moves, symmetric, self.count,
+         self.fingerprint) = HEADER.unpack_from(self._mmap, 0)
+        self.path = path
+        self.symmetric = bool(symmetric)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def __getstate__(self):
+        # Re-open the file in other processes instead of copying the mapping
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def _find(self, key):
+        """二分查找 key，返回条目下标，找不到返回 -1"""
+        mm = self._mmap
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            current = KEY.unpack_from(mm, HEADER.size + mid * ENTRY.size)[0]
+            if current < key:
+                low = mid + 1
+            elif current > key:
+                high = mid
+            else:
+                return mid
+        return -1
+
+    def lookup(self, board):
+        """查找局面，返回 (最佳方向, 期望值)，不在库中返回 None"""
+        key, symmetry = bitboard.canonical(board) if self.symmetric else (board, 0)
+        index = self._find(key)
+        if index < 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        _, value, direction = ENTRY.unpack_from(self._mmap, HEADER.size + index * ENTRY.size)
+        return bitboard.direction_from_symmetry(symmetry, bitboard.DIRECTIONS[direction]), value
+
+
+def write_book(path, entries, depth, moves, symmetric=False, fingerprint=0):
+    """把 {压缩棋盘: (方向, 期望值)} 按棋盘排序写入文件，fingerprint 为构建时评估函数的标识"""
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, depth, moves, symmetric, len(entries), fingerprint))
+        for board in sorted(entries):
+            direction, value = entries[board]
+            f.write(ENTRY.pack(board, value, bitboard.DIRECTIONS.index(direction)))
+
+
+def _key(board, symmetric):
+    return bitboard.canonical(board)[0] if symmetric else board
+
+
+def opening_positions(symmetric=False):
+    """所有可能的初始局面 (两个方块)，symmetric 为 True 时去掉对称重复"""
+    positions = set()
+    for a in range(0, 64, 4):
+        for b in range(a + 4, 64, 4):
+            for tile_a in (1, 2):
+                for tile_b in (1, 2):
+                    positions.add(_key((tile_a << a) | (tile_b << b), symmetric))
+    return positions
+
+
+def solve(board, searcher=None):
+    """搜索一个局面，返回 (压缩棋盘, 最佳方向, 期望值)；无路可走时方向为 None
+
+    不给出 searcher 时使用 search._init_worker 在本进程中建好的 Searcher。
+    """
+    import search
+    searcher = searcher or search._worker_searcher
+    best_direction = None
+    best_score = float('-inf')
+    for direction in searcher.directions:
+        new_board, moved = searcher.simulate_move(board, direction)
+        if moved:
+            score = (searcher.move_reward(board, direction) +
+                     searcher.expectimax(new_board, searcher.depth, False))
+            if score > best_score:
+                best_score, best_direction = score, direction
+    return board, best_direction, best_score
+
+
+def build_book(moves, searcher_config=None, workers=1, symmetric=False, log=None):
+    """展开前 moves 步的局面并逐个搜索，返回 {压缩棋盘: (方向, 期望值)}
+
+    symmetric 只能在评估函数对 8 个对称变换不变时使用。
+    """
+    from search import _init_worker
+    config = searcher_config or {}
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,))
+    else:
+        _init_worker(config)
+
+    entries = {}
+    frontier = opening_positions(symmetric)
+    try:
+        for ply in range(moves):
+            start = time.perf_counter()
+            if pool is not None:
+                results = pool.map(solve, frontier, chunksize=64)
+            else:
+                results = map(solve, frontier)
+            next_frontier = set()
+            for board, direction, value in results:
+                if direction is None:
+                    continue
+                entries[board] = (direction, value)
+                after = bitboard.move(board, direction)
+                for shift in bitboard.empty_shifts(after):
+                    for tile in (1, 2):
+                        child = _key(after | (tile << shift), symmetric)
+                        if child not in entries:
+                            next_frontier.add(child)
+            if log is not None:
+                print(f"第 {ply + 1} 步: {len(frontier)} 个局面，用时 {time.perf_counter() - start:.1f}s",
+                      file=log, flush=True)
+            frontier = next_frontier
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return entries
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="预先搜索开局局面，生成开局库")
+    parser.add_argument("--moves", type=int, default=2, help="展开的步数")
+    parser.add_argument("--depth", type=int, default=3, help="搜索深度")
+    parser.add_argument("--workers", type=int, default=1, help="并行搜索的进程数")
+    parser.add_argument("--evaluator", default=None,
+                        help="n-tuple 网络权重文件，与对局时使用的评估函数一致 (此时按对称合并局面)")
+    parser.add_argument("--weights", default=None, help="权重配置文件 (tuner.py 的输出)，与对局时一致")
+    parser.add_argument("--output", default="opening.book", help="开局库输出路径")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start = time.perf_counter()
+    # The n-tuple network sums over all 8 symmetries, the default heuristic does not
+    symmetric = args.evaluator is not None
+    config = {"depth": args.depth, "evaluator": args.evaluator}
+    if args.weights:
+        config.update(load_weights(args.weights))
+    entries = build_book(args.moves, config, args.workers, symmetric, log=sys.stdout)
+    from search import Searcher
+    fingerprint = Searcher(**config).evaluator_fingerprint()
+    write_book(args.output, entries, args.depth, args.moves, symmetric, fingerprint)
+    print(f"共 {len(entries)} 个局面，用时 {time.perf_counter() - start:.1f}s，已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+紧凑的二进制对局记录
+
+文件格式 (小端序):
+- 文件头 24 字节: 魔数 b"2048REC1"、版本号、检查点间隔 N、是否有种子、随机种子
+- 两个初始方块各占 1 字节
+- 之后每一步占 2 字节: 移动方向 (DIRECTIONS 中的下标 0~3) + 新生成的方块
+- 每 N 步之后插入一个检查点 (21 字节): 0xC0、压缩棋盘 (uint64)、分数 (uint64)、步数 (uint32)
+- 对局结束时写入结束标记 (13 字节): 0xFF、最终分数 (uint64)、总步数 (uint32)；
+  未完成的对局写入同样格式的未完成标记: 0xFE、当前分数、总步数
+
+生成方块的字节为 (指数 << 4) | 格子编号 (行优先 0~15)，所以 2 是 0x1?，4 是 0x2?。
+
+每一步的长度固定，第 k 步的位置可以直接算出来，跳到第 k 步只需要读取它之前最近的
+检查点再回放不超过 N 步。多局记录可以依次追加到同一个文件中，读取时用 mmap
+按需访问，不会把整个文件读进内存，几 GB 的归档文件也可以直接打开。
+读取时遇到任何不是合法步数据的字节 (标记或下一局的文件头) 就认为这一局到此结束，
+所以没有写结束标记就中断的记录也不会吞掉后面的对局。
+
+用法:
+    engine = GameEngine(seed=1)
+    engine.recorder = GameRecordWriter("game.rec", seed=1)   # 必须在 reset() 之前设置
+    engine.reset()
+    ...
+    engine.recorder.close(engine.score)
+
+    with GameRecordReader("game.rec") as reader:
+        for game in reader.games():
+            board, score = game.seek(100)
+"""
+
+import mmap
+import struct
+
+import bitboard
+
+MAGIC = b"2048REC1"
+VERSION = 1
+
+HEADER = struct.Struct("<8sHHB3xq")
+CHECKPOINT = struct.Struct("<BQQI")
+END = struct.Struct("<BQI")
+
+CHECKPOINT_TAG = 0xC0
+END_TAG = 0xFF
+UNFINISHED_TAG = 0xFE
+# Direction bytes are 0~3 and spawn bytes 0x10~0x2F (a 2 or a 4); tags and the first
+# byte of a header ("2" = 0x32) are all larger
+MAX_MOVE_BYTE = 0x2F
+
+_DIRECTION_CODES = {direction: code for code, direction in enumerate(bitboard.DIRECTIONS)}
+
+
+class GameRecordWriter:
+    """流式写入一局的记录，作为 GameEngine.recorder 使用"""
+
+    def __init__(self, file, seed=None, checkpoint_interval=64):
+        # Accept a path or an already open binary file (e.g. an archive opened in "ab" mode)
+        if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+            self.file = open(file, "wb")
+            self._owns_file = True
+        else:
+            self.file = file
+            self._owns_file = False
+        self.checkpoint_interval = checkpoint_interval
+        self.moves = 0
+        self.score = 0
+        self.closed = False
+
+        has_seed = isinstance(seed, int) and -2 ** 63 <= seed < 2 ** 63
+        self.file.write(HEADER.pack(MAGIC, VERSION, checkpoint_interval,
+                                    1 if has_seed else 0, seed if has_seed else 0))
+
+    def spawn(self, cell, value):
+        self.file.write(bytes(((value.bit_length() - 1) << 4 | cell,)))
+
+    def move(self, direction):
+        self.file.write(bytes((_DIRECTION_CODES[direction],)))
+
+    def after_move(self, grid, score):
+        self.moves += 1
+        self.score = score
+        if self.moves % self.checkpoint_interval == 0:
+            self.file.write(CHECKPOINT.pack(CHECKPOINT_TAG, bitboard.to_board(grid), score, self.moves))
+
+    def close(self, final_score=None):
+        """写入结束标记 (final_score 为 None 时写入未完成标记，记录视为未完成)"""
+        if self.closed:
+            return
+        self.closed = True
+        if final_score is not None:
+            self.file.write(END.pack(END_TAG, final_score, self.moves))
+        else:
+            self.file.write(END.pack(UNFINISHED_TAG, self.score, self.moves))
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+def _decode_spawn(byte):
+    """生成方块字节 -> 压缩棋盘中的 (位移, 指数)"""
+    return (byte & 0xF) * 4, byte >> 4
+
+
+class GameRecord:
+    """文件中一局记录的只读视图 (不复制数据)"""
+
+    def __init__(self, buffer, offset, end=None):
+        self.buffer = buffer
+        self.offset = offset
+        magic, version, interval, has_seed, seed = HEADER.unpack_from(buffer, offset)
+        if magic != MAGIC:
+            raise ValueError(f"不是对局记录 (偏移 {offset})")
+        if version != VERSION:
+            raise ValueError(f"不支持的记录版本: {version}")
+        self.checkpoint_interval = interval
+        self.seed = seed if has_seed else None
+        self.final_score = None
+        self._body = offset + HEADER.size + 2
+        self._scan(len(buffer) if end is None else end)
+
+    def _position(self, k):
+        """第 k 步 (从 0 开始) 的字节位置"""
+        return self._body + 2 * k + CHECKPOINT.size * (k // self.checkpoint_interval)
+
+    def _scan(self, limit):
+        """确定步数和记录的结束位置，按块跳过，不逐步解析"""
+        buffer = self.buffer
+        interval = self.checkpoint_interval
+        block = 2 * interval + CHECKPOINT.size
+        k = 0
+        pos = self._body
+        # A block whose bytes are all move bytes holds no end marker and no next header
+        while (pos + block <= limit and max(buffer[pos:pos + 2 * interval]) <= MAX_MOVE_BYTE
+               and buffer[pos + 2 * interval] == CHECKPOINT_TAG):
+            k += interval
+            pos += block
+        # Inside the last block: step over the remaining 2-byte moves, a record cut off
+        # without a marker stops at the next game's header
+        while pos + 2 <= limit and buffer[pos] < 4 and 0x10 <= buffer[pos + 1] <= MAX_MOVE_BYTE:
+            k += 1
+            pos += 2
+        if pos + END.size <= limit and buffer[pos] in (END_TAG, UNFINISHED_TAG):
+            tag, score, _ = END.unpack_from(buffer, pos)
+            if tag == END_TAG:
+                self.final_score = score
+            pos += END.size
+        self.num_moves = k
+        self.end = pos
+
+    def __len__(self):
+        return self.num_moves
+
+    def initial_board(self):
+        board = 0
+        for byte in self.buffer[self._body - 2:self._body]:
+            shift, exp = _decode_spawn(byte)
+            board |= exp << shift
+        return board
+
+    def checkpoint(self, index):
+        """第 index 个检查点的 (棋盘, 分数, 步数)，index 为 0 时是初始局面"""
+        if index == 0:
+            return self.initial_board(), 0, 0
+        pos = self._position(index * self.checkpoint_interval) - CHECKPOINT.size
+        tag, board, score, moves = CHECKPOINT.unpack_from(self.buffer, pos)
+        if tag != CHECKPOINT_TAG:
+            raise ValueError(f"检查点损坏 (偏移 {pos})")
+        return board, score, moves
+
+    def moves(self, start=0, stop=None):
+        """依次产出第 start ~ stop-1 步的 (方向, 生成方块的位移, 指数)"""
+        stop = self.num_moves if stop is None else min(stop, self.num_moves)
+        buffer = self.buffer
+        directions = bitboard.DIRECTIONS
+        for k in range(start, stop):
+            pos = self._position(k)
+            shift, exp = _decode_spawn(buffer[pos + 1])
+            yield directions[buffer[pos]], shift, exp
+
+    def replay(self, start=0):
+        """从第 start 步开始回放，依次产出每一步之后的 (步数, 方向, 棋盘, 分数)"""
+        board, score = self.seek(start)
+        k = start
+        for direction, shift, exp in self.moves(start):
+            score += bitboard.score_gain(board, direction)
+            board = bitboard.move(board, direction) | (exp << shift)
+            k += 1
+            yield k, direction, board, score
+
+    def seek(self, k):
+        """返回第 k 步之后的 (棋盘, 分数)，k 为 0 时是初始局面"""
+        if not 0 <= k <= self.num_moves:
+            raise IndexError(f"步数超出范围: {k} (共 {self.num_moves} 步)")
+        board, score, done = self.checkpoint(k // self.checkpoint_interval)
+        for direction, shift, exp in self.moves(done, k):
+            score += bitboard.score_gain(board, direction)
+            board = bitboard.move(board, direction) | (exp << shift)
+        return board, score
+
+
+class GameRecordReader:
+    """用 mmap 打开记录文件 (可以包含多局)"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def games(self):
+        """依次产出文件中的每一局 (GameRecord)"""
+        offset = 0
+        size = len(self.buffer)
+        while offset + HEADER.size + 2 <= size:
+            game = GameRecord(self.buffer, offset)
+            yield game
+            offset = game.end
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
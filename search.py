@@ -0,0 +1,593 @@
+"""
+AI 搜索核心 (不依赖 Tkinter)
+
+Expectimax 搜索和局面评估都在这里，agent.py 里的 AI2048 只负责界面和定时执行。
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import bitboard
+from depth_policy import make_policy
+from heuristic import DEFAULT_WEIGHT_MATRIX, TableHeuristic
+from ntuple import NTupleNetwork
+from opening import OpeningBook
+from transposition import TranspositionTable
+
+
+# Searcher living inside each pool worker, built once by _init_worker
+_worker_searcher = None
+
+
+def _init_worker(config):
+    global _worker_searcher
+    _worker_searcher = Searcher(**config)
+
+
+def _worker_expectimax(board, depth, is_max, prob=1.0):
+    """在工作进程中搜索，返回 (值, 访问的节点数)"""
+    nodes = _worker_searcher.nodes
+    value = _worker_searcher.expectimax(board, depth, is_max, prob)
+    return value, _worker_searcher.nodes - nodes
+
+
+class SearchTimeout(Exception):
+    """搜索超过了时间限制或被取消"""
+
+
+class Searcher:
+    def __init__(self, weight_matrix=None, depth=3, cache_size=200000, cache_policy="lru",
+                 workers=0, parallel_split="chance", time_limit_ms=None, max_depth=10,
+                 prob_cutoff=0.0, algorithm="expectimax", depth_policy=None, empty_weight=2000.0,
+                 merge_weight=800.0, smoothness_weight=100.0, monotonicity_weight=2.0,
+                 max_tile_weight=1.0, evaluator=None, book=None, cache_tables=True):
+        self.directions = ["up", "right", "down", "left"]
+        self.depth = depth
+        # Optional per-position depth (see depth_policy.py), replaces the fixed depth above
+        self.depth_policy = make_policy(depth_policy)
+        # "expectimax" or "star1" (same result, fewer nodes; fixed-depth serial search only)
+        self.algorithm = algorithm
+
+        # Anytime search: with a time limit the depth is deepened iteratively
+        # until the deadline instead of using the fixed depth above
+        self.time_limit_ms = time_limit_ms
+        self.max_depth = max_depth
+        self.last_depth = depth
+        self._deadline = None
+        self._cancelled = False
+
+        # Parallel search: workers > 1 spreads the root moves ("root") or the
+        # children of the first chance layer ("chance") across a process pool
+        self.workers = workers
+        self.parallel_split = parallel_split
+        self._pool = None
+
+        # Branches whose cumulative spawn probability drops below prob_cutoff
+        # are not searched further and get a static evaluation (0 disables it)
+        self.prob_cutoff = prob_cutoff
+        self._check_options()
+
+        # Number of expectimax nodes visited (including those visited by pool workers)
+        # and how many of them were cut off by prob_cutoff
+        self.nodes = 0
+        self.cutoffs = 0
+
+        # Transposition table, kept across moves so the previous turn's subtrees are reused
+        self.cache_size = cache_size
+        self.cache_policy = cache_policy  # "lru" or "depth"
+        self.transposition = TranspositionTable(self.cache_size, self.cache_policy)
+        # Upper bounds from fail-low star1 searches, kept apart from the exact values above
+        self.upper_bounds = TranspositionTable(self.cache_size, self.cache_policy)
+
+        # Weights
+        if weight_matrix is None:
+            weight_matrix = [row[:] for row in DEFAULT_WEIGHT_MATRIX]
+        self.weight_matrix = weight_matrix
+        self.empty_weight = empty_weight
+        self.merge_weight = merge_weight
+        self.smoothness_weight = smoothness_weight
+        self.monotonicity_weight = monotonicity_weight
+        self.max_tile_weight = max_tile_weight
+        # Board evaluator used by the search: by default the weights above split into
+        # per-row/per-column lookup tables. Any object with evaluate(board) and
+        # bounds(sum_low, sum_high) can replace it, a path loads an n-tuple network
+        self.evaluator = evaluator
+        self.cache_tables = cache_tables
+        if evaluator is None:
+            # cache_tables=False skips the disk cache, e.g. for weights tried once by tuner.py
+            self.heuristic = TableHeuristic(self.weight_matrix, empty_weight, merge_weight,
+                                            smoothness_weight, monotonicity_weight, max_tile_weight,
+                                            cache=cache_tables)
+        elif isinstance(evaluator, str):
+            self.heuristic = NTupleNetwork.load(evaluator)
+        else:
+            self.heuristic = evaluator
+        # Afterstate evaluators (n-tuple networks) leave out the points scored on the way,
+        # the search adds the move rewards itself and scores leaves right after a move
+        self.afterstate = getattr(self.heuristic, "afterstate", False)
+
+        # Opening book (see opening.py), consulted before searching; a path or an OpeningBook
+        self.book = OpeningBook(book) if isinstance(book, str) else book
+        if self.book is not None:
+            self._check_book(self.book)
+
+    def _check_options(self):
+        """拒绝会被忽略的参数组合"""
+        if self.algorithm not in ("expectimax", "star1"):
+            raise ValueError(f"未知的搜索算法: {self.algorithm}")
+        if self.algorithm != "star1":
+            return
+        # Iterative, parallel and probability-cut searches all run plain expectimax, and the
+        # cut-off table entries (value, prob) are not the plain values star1 stores
+        if self.time_limit_ms is not None:
+            raise ValueError("star1 不支持限时搜索 (time_limit_ms)")
+        if self.workers > 1:
+            raise ValueError("star1 不支持并行搜索 (workers > 1)")
+        if self.prob_cutoff:
+            raise ValueError("star1 不支持概率剪枝 (prob_cutoff)")
+
+    def evaluator_fingerprint(self):
+        """评估函数的标识 (见 TableHeuristic.fingerprint)，评估函数不提供时为 0"""
+        fingerprint = getattr(self.heuristic, "fingerprint", None)
+        return fingerprint() if fingerprint is not None else 0
+
+    def _check_book(self, book):
+        """开局库必须用相同的评估函数、不低于本搜索器的深度构建，否则拒绝使用
+
+        限时搜索和深度策略每步的深度不固定，只检查评估函数。
+        """
+        fingerprint = self.evaluator_fingerprint()
+        if book.fingerprint and fingerprint and book.fingerprint != fingerprint:
+            raise ValueError(f"开局库 {book.path} 是用另一个评估函数 (或另一组权重) 构建的")
+        if self.time_limit_ms is None and self.depth_policy is None and book.depth < self.depth:
+            raise ValueError(f"开局库 {book.path} 的搜索深度 {book.depth} 低于当前的搜索深度 {self.depth}")
+
+    def evaluate_position(self, grid):
+        """评估当前局面分数 - 这是AI用来选择最佳移动的评分，不是游戏分数"""
+        score = 0
+        empty_cells = 0
+        max_tile = 0
+        merges = 0
+
+        # Positional Weight
+        for i in range(4):
+            for j in range(4):
+                if grid[i][j] == 0:
+                    empty_cells += 1
+                else:
+                    # 基础位置得分
+                    score += grid[i][j] * self.weight_matrix[i][j]
+                    max_tile = max(max_tile, grid[i][j])
+
+        # Check possible merges
+        for i in range(4):
+            for j in range(3):
+                # Merge horizontally
+                if grid[i][j] != 0 and grid[i][j] == grid[i][j + 1]:
+                    merges += 1
+                # Merge vertically
+                if grid[j][i] != 0 and grid[j][i] == grid[j + 1][i]:
+                    merges += 1
+
+        # Smoothness Score: Variance of adjacent numbers
+        smoothness = 0
+        for i in range(4):
+            for j in range(4):
+                if grid[i][j] != 0:
+                    # Right Check
+                    if j < 3 and grid[i][j + 1] != 0:
+                        smoothness -= abs(grid[i][j] - grid[i][j + 1])
+                    # Bottom Check
+                    if i < 3 and grid[i + 1][j] != 0:
+                        smoothness -= abs(grid[i][j] - grid[i + 1][j])
+
+        monotonicity = 0
+        # Check Monotonicity for Each Row
+        for i in range(4):
+            current_row = [x if x != 0 else float('-inf') for x in grid[i]]
+            if all(current_row[j] >= current_row[j + 1] for j in range(3)):
+                monotonicity += sum(x for x in current_row if x != float('-inf'))
+
+        # Check Monotonicity for Each Column
+        for j in range(4):
+            current_col = [grid[i][j] if grid[i][j] != 0 else float('-inf') for i in range(4)]
+            if all(current_col[i] >= current_col[i + 1] for i in range(3)):
+                monotonicity += sum(x for x in current_col if x != float('-inf'))
+
+        # Overall Evaluation Score
+        final_score = (
+                score * 1.0 +
+                empty_cells * self.empty_weight +
+                merges * self.merge_weight +
+                smoothness * self.smoothness_weight +
+                monotonicity * self.monotonicity_weight +
+                (max_tile ** 2) * self.max_tile_weight
+        )
+
+        return final_score
+
+    def evaluate_board(self, board):
+        """评估压缩棋盘的局面分数 (默认评估函数与 evaluate_position 结果一致)"""
+        return self.heuristic.evaluate(board)
+
+    def move_reward(self, board, direction):
+        """移动的得分，只有 afterstate 评估函数需要把它计入搜索值"""
+        return bitboard.score_gain(board, direction) if self.afterstate else 0
+
+    def evaluate_leaf(self, board, is_max):
+        """叶子节点的评估值
+
+        afterstate 评估函数只能评估移动之后的局面，Max 叶子取一步贪心:
+        各方向 "得分 + 移动后局面的评估值" 的最大值，无路可走时为 0。
+        所以使用这种评估函数时，奇数深度与下一个偶数深度的结果相同。
+        """
+        if not (is_max and self.afterstate):
+            return self.evaluate_board(board)
+        best = 0.0
+        for direction in self.directions:
+            new_board, moved = self.simulate_move(board, direction)
+            if moved:
+                best = max(best, bitboard.score_gain(board, direction) + self.evaluate_board(new_board))
+        return best
+
+    def simulate_move(self, board, direction):
+        """在压缩棋盘上模拟移动，返回 (新棋盘, 是否移动)"""
+        new_board = bitboard.MOVES[direction](board)
+        return new_board, new_board != board
+
+    def get_empty_cells(self, board):
+        """获取空格子的位置"""
+        return [(shift >> 4, (shift >> 2) & 3) for shift in bitboard.empty_shifts(board)]
+
+    def expectimax(self, board, depth, is_max, prob=1.0):
+        """使用Expectimax算法进行搜索，prob 为到达该节点的累计概率"""
+        self.nodes += 1
+        if self._deadline is not None and not self.nodes & 0x3FF and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+        if depth == 0:
+            return self.evaluate_leaf(board, is_max)
+        if prob < self.prob_cutoff:
+            self.cutoffs += 1
+            return self.evaluate_leaf(board, is_max)
+
+        cached = self.transposition.lookup(board, depth, is_max)
+        if cached is not None:
+            if not self.prob_cutoff:
+                return cached
+            # A value searched at this prob or lower had no cutoff below it, so it would
+            # not have one on this path either
+            value, searched_prob = cached
+            if prob >= searched_prob:
+                return value
+        cutoffs = self.cutoffs
+
+        if is_max:
+            max_score = float('-inf')
+            for direction in self.directions:
+                new_board, moved = self.simulate_move(board, direction)
+                if moved:
+                    score = self.expectimax(new_board, depth - 1, False, prob)
+                    if self.afterstate:
+                        score += bitboard.score_gain(board, direction)
+                    max_score = max(max_score, score)
+            result = max_score if max_score != float('-inf') else self.evaluate_leaf(board, True)
+        else:
+            empty_shifts = bitboard.empty_shifts(board)
+            if not empty_shifts:
+                result = self.evaluate_board(board)
+            else:
+                avg_score = 0
+                possibilities = len(empty_shifts)
+                prob_2 = prob * 0.9 / possibilities
+                prob_4 = prob * 0.1 / possibilities
+
+                for shift in empty_shifts:
+                    score = (0.9 * self.expectimax(board | (1 << shift), depth - 1, True, prob_2) +
+                             0.1 * self.expectimax(board | (2 << shift), depth - 1, True, prob_4))
+                    avg_score += score / possibilities
+                result = avg_score
+
+        # The cache key ignores prob: a value cut off below this node is only right for
+        # this path, keep it out of the table so results do not depend on search order
+        if not self.prob_cutoff:
+            self.transposition.store(board, depth, is_max, result)
+        elif self.cutoffs == cutoffs:
+            self.transposition.store(board, depth, is_max, (result, prob))
+        return result
+
+    def _child_bounds(self, board_sum, depth):
+        """深度为 depth 的 Max 节点 (方块总和为 board_sum) 的取值范围"""
+        # Each chance layer below adds a 2 or a 4; merges keep the sum unchanged
+        spawns = depth // 2
+        low, high = self.heuristic.bounds(board_sum, board_sum + 4 * spawns)
+        if self.afterstate:
+            # A move scores at most the tile sum, and a finished game is worth 0
+            moves = depth // 2 + 1
+            low, high = min(low, 0.0), high + moves * (board_sum + 4 * spawns)
+        return low, high
+
+    def star1(self, board, depth, is_max, alpha=float('-inf'), beta=float('inf')):
+        """带 Star1 剪枝的 Expectimax
+
+        值落在 (alpha, beta) 内时与 expectimax 的结果完全相同；
+        否则返回一个不超过 alpha 的上界或不低于 beta 的下界。
+        Chance 节点用评估函数在该方块总和下的取值范围估计尚未搜索的子节点。
+        """
+        self.nodes += 1
+        if self._deadline is not None and not self.nodes & 0x3FF and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+        if depth == 0:
+            return self.evaluate_leaf(board, is_max)
+
+        cached = self.transposition.lookup(board, depth, is_max)
+        if cached is not None:
+            return cached
+        # Upper bound left by an earlier fail-low search of the same node
+        upper = self.upper_bounds.lookup(board, depth, is_max)
+        if upper is not None and upper <= alpha:
+            return upper
+
+        if is_max:
+            max_score = float('-inf')
+            for direction in self.directions:
+                new_board, moved = self.simulate_move(board, direction)
+                if moved:
+                    reward = bitboard.score_gain(board, direction) if self.afterstate else 0
+                    score = reward + self.star1(new_board, depth - 1, False,
+                                                max(alpha, max_score) - reward, beta - reward)
+                    max_score = max(max_score, score)
+                    if max_score >= beta:
+                        return max_score
+            if max_score == float('-inf'):
+                result = self.evaluate_leaf(board, True)
+            elif max_score <= alpha:
+                # Every move failed low, this is only an upper bound
+                self.upper_bounds.store(board, depth, is_max, max_score)
+                return max_score
+            else:
+                result = max_score
+        else:
+            empty_shifts = bitboard.empty_shifts(board)
+            if not empty_shifts:
+                result = self.evaluate_board(board)
+            else:
+                board_sum = bitboard.tile_sum(board)
+                low_2, high_2 = self._child_bounds(board_sum + 2, depth - 1)
+                low_4, high_4 = self._child_bounds(board_sum + 4, depth - 1)
+                cell_low = 0.9 * low_2 + 0.1 * low_4
+                cell_high = 0.9 * high_2 + 0.1 * high_4
+
+                avg_score = 0
+                possibilities = len(empty_shifts)
+                remaining = possibilities
+
+                for shift in empty_shifts:
+                    remaining -= 1
+                    # Best and worst case contribution of the cells not searched yet
+                    rest_high = remaining * cell_high / possibilities
+                    rest_low = remaining * cell_low / possibilities
+                    need_low = (alpha - avg_score - rest_high) * possibilities
+                    need_high = (beta - avg_score - rest_low) * possibilities
+
+                    alpha_2 = (need_low - 0.1 * high_4) / 0.9
+                    beta_2 = (need_high - 0.1 * low_4) / 0.9
+                    score_2 = self.star1(board | (1 << shift), depth - 1, True, alpha_2, beta_2)
+                    if score_2 <= alpha_2:
+                        upper = min(alpha, avg_score + (0.9 * score_2 + 0.1 * high_4) / possibilities + rest_high)
+                        self.upper_bounds.store(board, depth, is_max, upper)
+                        return upper
+                    if score_2 >= beta_2:
+                        return max(beta, avg_score + (0.9 * score_2 + 0.1 * low_4) / possibilities + rest_low)
+
+                    alpha_4 = (need_low - 0.9 * score_2) / 0.1
+                    beta_4 = (need_high - 0.9 * score_2) / 0.1
+                    score_4 = self.star1(board | (2 << shift), depth - 1, True, alpha_4, beta_4)
+                    if score_4 <= alpha_4:
+                        upper = min(alpha, avg_score + (0.9 * score_2 + 0.1 * score_4) / possibilities + rest_high)
+                        self.upper_bounds.store(board, depth, is_max, upper)
+                        return upper
+                    if score_4 >= beta_4:
+                        return max(beta, avg_score + (0.9 * score_2 + 0.1 * score_4) / possibilities + rest_low)
+
+                    # Same arithmetic as expectimax so the exact value matches bit for bit
+                    score = (0.9 * score_2 + 0.1 * score_4)
+                    avg_score += score / possibilities
+                result = avg_score
+
+        self.transposition.store(board, depth, is_max, result)
+        return result
+
+    def get_best_move(self, grid):
+        """获取最佳移动方向"""
+        # Convert once at the game boundary, search runs on the packed board
+        return self.choose_move(bitboard.to_board(grid))
+
+    def cancel(self):
+        """取消正在进行的搜索 (可以在其他线程中调用)，choose_move 会抛出 SearchTimeout"""
+        self._cancelled = True
+        # Any past deadline makes the next periodic check in the search abort
+        self._deadline = 0.0
+
+    def clear_cancel(self):
+        """清除取消标记，在开始新的搜索之前调用"""
+        self._cancelled = False
+        self._deadline = None
+
+    def choose_move(self, board):
+        """在压缩棋盘上获取最佳移动方向"""
+        if self._cancelled:
+            raise SearchTimeout()
+        if self.book is not None:
+            found = self.book.lookup(board)
+            if found is not None:
+                self.last_depth = self.book.depth
+                return found[0]
+        if self.time_limit_ms is not None:
+            return self._choose_move_iterative(board)
+        depth = self.depth if self.depth_policy is None else self.depth_policy(board)
+        self.last_depth = depth
+        if self.workers > 1:
+            return self._choose_move_parallel(board, depth)
+
+        best_score = float('-inf')
+        best_direction = None
+        use_star1 = self.algorithm == "star1"
+
+        # Evaluate every possible direction
+        for direction in self.directions:
+            new_board, moved = self.simulate_move(board, direction)
+            if moved:
+                reward = self.move_reward(board, direction)
+                if use_star1:
+                    # Moves that cannot beat the best one so far are cut off early
+                    score = reward + self.star1(new_board, depth, False, alpha=best_score - reward)
+                else:
+                    # Evaluate by expectimax
+                    score = reward + self.expectimax(new_board, depth=depth, is_max=False)
+                if score > best_score:
+                    best_score = score
+                    best_direction = direction
+
+        return best_direction
+
+    def _worker_config(self):
+        return {
+            "weight_matrix": self.weight_matrix,
+            "empty_weight": self.empty_weight,
+            "merge_weight": self.merge_weight,
+            "smoothness_weight": self.smoothness_weight,
+            "monotonicity_weight": self.monotonicity_weight,
+            "max_tile_weight": self.max_tile_weight,
+            "evaluator": self.evaluator,
+            "cache_tables": self.cache_tables,
+            "depth": self.depth,
+            "cache_size": self.cache_size,
+            "cache_policy": self.cache_policy,
+            "prob_cutoff": self.prob_cutoff,
+        }
+
+    def _get_pool(self):
+        """获取进程池 (第一次使用时创建，之后一直保持)"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self._worker_config(),)
+            )
+        return self._pool
+
+    def close(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _choose_move_parallel(self, board, depth):
+        """并行版本的 choose_move，结果与串行搜索完全相同"""
+        pool = self._get_pool()
+        split_chance = self.parallel_split == "chance" and depth > 0
+
+        # Submit everything first, then combine in the same order as the serial search
+        jobs = []
+        for direction in self.directions:
+            new_board, moved = self.simulate_move(board, direction)
+            if not moved:
+                continue
+            if not split_chance:
+                jobs.append((direction, "root", pool.submit(_worker_expectimax, new_board, depth, False)))
+                continue
+            empty_shifts = bitboard.empty_shifts(new_board)
+            if not empty_shifts:
+                jobs.append((direction, "leaf", self.evaluate_board(new_board)))
+                continue
+            possibilities = len(empty_shifts)
+            children = [(pool.submit(_worker_expectimax, new_board | (1 << shift), depth - 1, True,
+                                     0.9 / possibilities),
+                         pool.submit(_worker_expectimax, new_board | (2 << shift), depth - 1, True,
+                                     0.1 / possibilities))
+                        for shift in empty_shifts]
+            jobs.append((direction, "chance", children))
+
+        best_score = float('-inf')
+        best_direction = None
+        for direction, kind, job in jobs:
+            if kind == "leaf":
+                score = job
+            elif kind == "chance":
+                score = 0
+                possibilities = len(job)
+                for with_2, with_4 in job:
+                    if self._cancelled:
+                        self._cancel_jobs(jobs)
+                        raise SearchTimeout()
+                    value_2, nodes_2 = with_2.result()
+                    value_4, nodes_4 = with_4.result()
+                    self.nodes += nodes_2 + nodes_4
+                    score += (0.9 * value_2 + 0.1 * value_4) / possibilities
+            else:
+                if self._cancelled:
+                    self._cancel_jobs(jobs)
+                    raise SearchTimeout()
+                score, nodes = job.result()
+                self.nodes += nodes
+            score += self.move_reward(board, direction)
+            if score > best_score:
+                best_score = score
+                best_direction = direction
+
+        return best_direction
+
+    @staticmethod
+    def _cancel_jobs(jobs):
+        for _, kind, job in jobs:
+            if kind == "root":
+                job.cancel()
+            elif kind == "chance":
+                for with_2, with_4 in job:
+                    with_2.cancel()
+                    with_4.cancel()
+
+    def _choose_move_iterative(self, board):
+        """迭代加深搜索: 逐层加深直到时间用完，返回最后一个完成层的最佳移动"""
+        deadline = time.perf_counter() + self.time_limit_ms / 1000.0
+        candidates = []
+        for direction in self.directions:
+            new_board, moved = self.simulate_move(board, direction)
+            if moved:
+                candidates.append((direction, new_board))
+
+        self.last_depth = 0
+        if len(candidates) <= 1:
+            return candidates[0][0] if candidates else None
+
+        best_direction = None
+        try:
+            for depth in range(1, self.max_depth + 1):
+                # Depth 1 always completes so there is a move to fall back on
+                self._deadline = deadline if depth > 1 else None
+                if self._cancelled:
+                    raise SearchTimeout()
+                scores = {}
+                try:
+                    for direction, new_board in candidates:
+                        scores[direction] = (self.expectimax(new_board, depth, False) +
+                                             self.move_reward(board, direction))
+                except SearchTimeout:
+                    if self._cancelled:
+                        raise
+                    # Candidates are ordered best-first, so once the previous best move
+                    # has been re-searched the partial iteration is still usable
+                    if best_direction in scores:
+                        best_direction = max(scores, key=scores.get)
+                    break
+
+                best_direction = max(scores, key=scores.get)
+                self.last_depth = depth
+                # Search the most promising moves first in the next iteration
+                candidates.sort(key=lambda item: scores[item[0]], reverse=True)
+                if time.perf_counter() >= deadline:
+                    break
+        finally:
+            self._deadline = None
+
+        return best_direction
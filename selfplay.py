@@ -0,0 +1,215 @@
+"""
+无界面批量自我对弈
+
+以全速运行 N 局带随机种子的 AI 对局 (可选多进程)，把每局的摘要逐行写入 JSONL，
+最后打印汇总统计: 达成 2048/4096/8192 的比例、每秒局数、每秒步数。
+
+用法示例:
+    python selfplay.py --games 100 --seed 1 --workers 4 --output results.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import GameEngine
+from heuristic import load_weights
+from instrument import SearchStats
+from record import GameRecordWriter
+from search import Searcher
+
+MILESTONES = (2048, 4096, 8192)
+
+# Building the heuristic tables is the slow part, so each process keeps its most
+# recently used searchers (the tables take several MB, tuner.py goes through many configs)
+_searchers = {}
+MAX_SEARCHERS = 4
+
+
+def get_searcher(searcher_config=None):
+    """获取 (并缓存) 指定配置的搜索器"""
+    config = searcher_config or {}
+    key = json.dumps(config, sort_keys=True)
+    searcher = _searchers.pop(key, None)
+    if searcher is None:
+        while len(_searchers) >= MAX_SEARCHERS:
+            _searchers.pop(next(iter(_searchers))).close()
+        searcher = Searcher(**config)
+    _searchers[key] = searcher
+    return searcher
+
+
+def play_game(seed, searcher_config=None, max_moves=None, record_dir=None, stats_every=0):
+    """用给定种子完整下一局，返回对局摘要
+
+    给出 record_dir 时把对局记录写到该目录；stats_every 大于 0 时每隔这么多步
+    统计一次搜索细节，汇总放在摘要的 "stats" 中。
+    """
+    engine = GameEngine(seed=seed)
+    if record_dir is not None:
+        engine.recorder = GameRecordWriter(os.path.join(record_dir, f"game_{seed}.rec"), seed=seed)
+    engine.reset()
+    searcher = get_searcher(searcher_config)
+    # Every game starts from a cold cache so node counts are comparable
+    searcher.transposition.clear()
+    searcher.upper_bounds.clear()
+    searcher.nodes = 0
+    searcher.cutoffs = 0
+    stats = None
+    if stats_every:
+        stats = SearchStats(sample_every=stats_every)
+        stats.attach(searcher)
+
+    moves = 0
+    depth_total = 0
+    start = time.perf_counter()
+    while engine.can_move():
+        if max_moves is not None and moves >= max_moves:
+            break
+        direction = searcher.get_best_move(engine.grid)
+        if direction is None:
+            break
+        if stats is not None and stats.sampled():
+            apply_start = time.perf_counter()
+            engine.move(direction)
+            stats.add_phase("apply", time.perf_counter() - apply_start)
+        else:
+            engine.move(direction)
+        moves += 1
+        depth_total += searcher.last_depth
+    wall_time = time.perf_counter() - start
+    if engine.recorder is not None:
+        engine.recorder.close(engine.score)
+    if stats is not None:
+        stats.detach()
+
+    result = {
+        "seed": seed,
+        "score": engine.score,
+        "max_tile": engine.max_tile(),
+        "moves": moves,
+        "wall_time": wall_time,
+        "nodes": searcher.nodes,
+        "cutoffs": searcher.cutoffs,
+        "mean_depth": depth_total / moves if moves else 0.0,
+    }
+    if stats is not None:
+        result["stats"] = stats.summary()
+    return result
+
+
+def _play_game_job(args):
+    return play_game(*args)
+
+
+def run_games(games, seed=0, searcher_config=None, max_moves=None, workers=1, record_dir=None,
+              stats_every=0):
+    """依次产出每局的摘要 (按种子顺序)"""
+    jobs = [(seed + i, searcher_config, max_moves, record_dir, stats_every) for i in range(games)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_play_game_job, jobs)
+    else:
+        for job in jobs:
+            yield _play_game_job(job)
+
+
+def summarize(results, elapsed):
+    """汇总统计"""
+    count = len(results)
+    total_moves = sum(r["moves"] for r in results)
+    total_nodes = sum(r["nodes"] for r in results)
+    total_cutoffs = sum(r["cutoffs"] for r in results)
+    summary = {
+        "games": count,
+        "elapsed": elapsed,
+        "mean_score": sum(r["score"] for r in results) / count if count else 0.0,
+        "best_score": max((r["score"] for r in results), default=0),
+        "games_per_second": count / elapsed if elapsed else 0.0,
+        "moves_per_second": total_moves / elapsed if elapsed else 0.0,
+        "nodes_per_second": total_nodes / elapsed if elapsed else 0.0,
+        "nodes_per_move": total_nodes / total_moves if total_moves else 0.0,
+        "cutoffs_per_move": total_cutoffs / total_moves if total_moves else 0.0,
+        "mean_depth": (sum(r["mean_depth"] * r["moves"] for r in results) / total_moves
+                       if total_moves else 0.0),
+    }
+    for tile in MILESTONES:
+        reached = sum(1 for r in results if r["max_tile"] >= tile)
+        summary[f"rate_{tile}"] = reached / count if count else 0.0
+    return summary
+
+
+def print_summary(summary, file=sys.stdout):
+    print(f"对局数: {summary['games']}  用时: {summary['elapsed']:.1f}s", file=file)
+    print(f"平均分数: {summary['mean_score']:.0f}  最高分数: {summary['best_score']}", file=file)
+    for tile in MILESTONES:
+        print(f"达成 {tile}: {summary[f'rate_{tile}'] * 100:.1f}%", file=file)
+    print(f"每秒局数: {summary['games_per_second']:.3f}  "
+          f"每秒步数: {summary['moves_per_second']:.1f}  "
+          f"每秒节点数: {summary['nodes_per_second']:.0f}  "
+          f"平均搜索深度: {summary['mean_depth']:.2f}", file=file)
+    print(f"每步节点数: {summary['nodes_per_move']:.0f}  "
+          f"每步概率剪枝次数: {summary['cutoffs_per_move']:.0f}", file=file)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="无界面批量运行 AI 对局")
+    parser.add_argument("--games", type=int, default=10, help="对局数量")
+    parser.add_argument("--seed", type=int, default=0, help="第一局的随机种子，之后每局加一")
+    parser.add_argument("--depth", type=int, default=3, help="搜索深度")
+    parser.add_argument("--adaptive-depth", action="store_true",
+                        help="按局面选择搜索深度 (空格多时浅搜、局面紧张时深搜)，忽略 --depth")
+    parser.add_argument("--weights", default=None, help="权重配置文件 (tuner.py 的输出)")
+    parser.add_argument("--evaluator", default=None,
+                        help="n-tuple 网络权重文件 (ntuple.py 的输出)，代替默认评估函数")
+    parser.add_argument("--book", default=None, help="开局库文件 (opening.py 的输出)")
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help="每步的思考时间 (毫秒)，设置后使用迭代加深搜索")
+    parser.add_argument("--algorithm", choices=["expectimax", "star1"], default="expectimax",
+                        help="搜索算法 (star1 与 expectimax 结果相同，但会剪掉不可能更优的分支)")
+    parser.add_argument("--prob-cutoff", type=float, default=0.0,
+                        help="累计概率低于该值的分支直接静态评估 (0 表示不剪枝)")
+    parser.add_argument("--workers", type=int, default=1, help="并行运行对局的进程数")
+    parser.add_argument("--max-moves", type=int, default=None, help="每局最多步数")
+    parser.add_argument("--output", default=None, help="逐局摘要写入的 JSONL 文件")
+    parser.add_argument("--record-dir", default=None,
+                        help="把每局的二进制对局记录 (game_<种子>.rec) 写入该目录")
+    parser.add_argument("--stats", type=int, default=0, metavar="N",
+                        help="每 N 步统计一次搜索细节 (各深度节点数、评估次数、缓存命中等)，写入每局摘要")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    searcher_config = {"depth": args.depth, "time_limit_ms": args.time_limit,
+                       "prob_cutoff": args.prob_cutoff, "algorithm": args.algorithm,
+                       "depth_policy": "adaptive" if args.adaptive_depth else None,
+                       "evaluator": args.evaluator, "book": args.book}
+    if args.weights:
+        searcher_config.update(load_weights(args.weights))
+
+    if args.record_dir:
+        os.makedirs(args.record_dir, exist_ok=True)
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    results = []
+    start = time.perf_counter()
+    try:
+        for result in run_games(args.games, args.seed, searcher_config, args.max_moves,
+                                args.workers, args.record_dir, args.stats):
+            results.append(result)
+            if out is not None:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    print_summary(summarize(results, elapsed))
+
+
+if __name__ == "__main__":
+    main()
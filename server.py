@@ -0,0 +1,267 @@
+"""
+对局服务器
+
+在本机开一个 TCP 端口，同时托管多局互相独立的无界面对局 (每局一个 GameEngine)，
+供机器人、看板和评测脚本等客户端使用。基于 asyncio，单线程处理所有连接；
+"让 AI 走" 的请求交给进程池里的 Searcher，不会阻塞其他客户端。
+
+协议为 JSON Lines: 客户端每行发送一个 JSON 请求，服务器按顺序每行回复一个 JSON。
+请求中的 "id" 会原样放回回复中。成功的回复带 "ok": true，失败的带 "ok": false 和 "error"。
+
+- {"op": "new", "seed": 1}                                 新建对局 (seed 可省略)
+- {"op": "move", "session": 1, "directions": ["up", ...]}  依次执行多步移动
+- {"op": "state", "session": 1}                            查询局面
+- {"op": "ai", "session": 1, "moves": 5, "apply": true}    让 AI 计算 (并执行) 若干步
+- {"op": "close", "session": 1}                            结束对局
+- {"op": "stats"}                                          会话数、每局内存、各请求的延迟分位数
+
+局面相关的回复都带有 "grid"、"score"、"moves"、"game_over"。
+
+用法:
+    python server.py --port 2048 --ai-workers 2
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bitboard
+import search
+from engine import GameEngine
+
+# Latencies kept per request type for the percentiles in "stats"
+LATENCY_WINDOW = 10000
+PERCENTILES = (50, 90, 99)
+
+
+def _worker_best_move(board):
+    # The pool initializer is search._init_worker, which builds the worker's Searcher
+    return search._worker_searcher.choose_move(board)
+
+
+class RequestError(Exception):
+    """请求无效，错误信息会返回给客户端"""
+
+
+class Session:
+    def __init__(self, session_id, seed=None):
+        self.id = session_id
+        self.engine = GameEngine(seed=seed)
+        self.engine.reset()
+        self.moves = 0
+        # Moves of one session are applied one request at a time, even across AI waits
+        self.lock = asyncio.Lock()
+
+    def memory(self):
+        """估算这局对局占用的内存 (字节)"""
+        engine = self.engine
+        size = sys.getsizeof(self) + sys.getsizeof(self.__dict__)
+        size += sys.getsizeof(engine) + sys.getsizeof(engine.__dict__) + sys.getsizeof(engine.rng)
+        size += sys.getsizeof(engine.grid) + sum(sys.getsizeof(row) for row in engine.grid)
+        return size
+
+    def state(self):
+        return {
+            "session": self.id,
+            "grid": self.engine.grid,
+            "score": self.engine.score,
+            "moves": self.moves,
+            "game_over": not self.engine.can_move(),
+        }
+
+
+class GameServer:
+    def __init__(self, searcher_config=None, ai_workers=1, max_sessions=10000):
+        self.searcher_config = searcher_config or {}
+        self.ai_workers = ai_workers
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self._next_id = 1
+        self._pool = None
+        self.latencies = {}
+        self.handlers = {
+            "new": self.op_new,
+            "move": self.op_move,
+            "state": self.op_state,
+            "ai": self.op_ai,
+            "close": self.op_close,
+            "stats": self.op_stats,
+        }
+
+    def _get_pool(self):
+        """获取 AI 进程池 (第一次使用时创建)"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.ai_workers,
+                initializer=search._init_worker,
+                initargs=(self.searcher_config,)
+            )
+        return self._pool
+
+    def close(self):
+        """关闭 AI 进程池"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _session(self, request):
+        session = self.sessions.get(request.get("session"))
+        if session is None:
+            raise RequestError(f"没有这个对局: {request.get('session')}")
+        return session
+
+    async def op_new(self, request):
+        if len(self.sessions) >= self.max_sessions:
+            raise RequestError("对局数量已达上限")
+        session = Session(self._next_id, request.get("seed"))
+        self._next_id += 1
+        self.sessions[session.id] = session
+        return session.state()
+
+    async def op_move(self, request):
+        session = self._session(request)
+        directions = request.get("directions", [])
+        if (not isinstance(directions, list)
+                or any(direction not in bitboard.DIRECTIONS for direction in directions)):
+            raise RequestError(f"方向只能是 {', '.join(bitboard.DIRECTIONS)}")
+        async with session.lock:
+            moved = []
+            for direction in directions:
+                result = session.engine.move(direction)
+                session.moves += result
+                moved.append(result)
+            return dict(session.state(), moved=moved)
+
+    async def op_state(self, request):
+        return self._session(request).state()
+
+    async def op_ai(self, request):
+        if self.ai_workers < 1:
+            raise RequestError("服务器没有开启 AI")
+        session = self._session(request)
+        count = request.get("moves", 1)
+        apply = request.get("apply", True)
+        if not isinstance(count, int) or count < 1:
+            raise RequestError("moves 必须是正整数")
+        loop = asyncio.get_running_loop()
+        async with session.lock:
+            directions = []
+            for _ in range(count if apply else 1):
+                if not session.engine.can_move():
+                    break
+                board = bitboard.to_board(session.engine.grid)
+                try:
+                    direction = await loop.run_in_executor(self._get_pool(), _worker_best_move, board)
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory), start a fresh pool on the next request
+                    self.close()
+                    raise RequestError("AI 进程异常退出，请重试")
+                if direction is None:
+                    break
+                directions.append(direction)
+                if apply:
+                    session.moves += session.engine.move(direction)
+            return dict(session.state(), directions=directions)
+
+    async def op_close(self, request):
+        session = self._session(request)
+        del self.sessions[session.id]
+        return {"session": session.id}
+
+    async def op_stats(self, request):
+        memory = [session.memory() for session in self.sessions.values()]
+        latencies = {}
+        for op, samples in self.latencies.items():
+            ordered = sorted(samples)
+            latencies[op] = {"count": len(ordered)}
+            for p in PERCENTILES:
+                index = min(len(ordered) - 1, len(ordered) * p // 100)
+                latencies[op][f"p{p}_ms"] = ordered[index] * 1000
+        return {
+            "sessions": len(self.sessions),
+            "session_bytes": sum(memory) / len(memory) if memory else 0,
+            "total_session_bytes": sum(memory),
+            "latency": latencies,
+        }
+
+    async def handle_request(self, request):
+        """处理一个请求，返回回复 (字典)"""
+        start = time.perf_counter()
+        op = request.get("op") if isinstance(request, dict) else None
+        handler = self.handlers.get(op)
+        try:
+            if handler is None:
+                raise RequestError(f"未知的操作: {op}")
+            reply = dict(await handler(request), ok=True)
+        except RequestError as e:
+            reply = {"ok": False, "error": str(e)}
+        except (TypeError, ValueError) as e:
+            # Fields of the wrong type, e.g. a list as session id
+            reply = {"ok": False, "error": f"请求格式错误: {e}"}
+        except Exception as e:
+            # Anything else is a server bug, report it instead of dropping the connection
+            reply = {"ok": False, "error": f"服务器内部错误: {type(e).__name__}: {e}"}
+        if isinstance(request, dict) and "id" in request:
+            reply["id"] = request["id"]
+        if handler is not None:
+            samples = self.latencies.get(op)
+            if samples is None:
+                samples = self.latencies[op] = deque(maxlen=LATENCY_WINDOW)
+            samples.append(time.perf_counter() - start)
+        return reply
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    reply = {"ok": False, "error": "请求不是合法的 JSON"}
+                else:
+                    reply = await self.handle_request(request)
+                writer.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=2048):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="在本机端口上托管多局无界面 2048 对局")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=2048, help="监听端口")
+    parser.add_argument("--ai-workers", type=int, default=1, help="AI 进程数 (0 表示不提供 AI)")
+    parser.add_argument("--depth", type=int, default=3, help="AI 搜索深度")
+    parser.add_argument("--max-sessions", type=int, default=10000, help="最多同时存在的对局数")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = GameServer({"depth": args.depth}, args.ai_workers, args.max_sessions)
+    print(f"正在监听 {args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+预计算查找表的磁盘缓存
+
+bitboard 的移动表和 TableHeuristic 的评估表第一次构建要 1 秒多，每次启动
+(以及每个工作进程) 都重新算一遍很浪费。第一次构建后把表写到缓存目录，
+之后启动时用 mmap 映射文件读回，只需要几毫秒。
+
+缓存目录默认为 ~/.cache/2048-jasmiana，可以用环境变量 JASMIANA_2048_CACHE 指定，
+设为空字符串则关闭缓存 (大端序机器上也不使用缓存)。文件名包含生成参数的哈希，参数不同的表互不影响；
+生成表的代码改变时，调用方应修改传入的版本号。
+
+文件格式 (小端序): 魔数 b"2048TBL1"、表的数量 (uint32)，每张表的类型码 (1 字节)
+和长度 (uint64)，之后依次是每张表的数据 (array 的原始字节)。
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b"2048TBL1"
+HEADER = struct.Struct("<8sI")
+TABLE = struct.Struct("<cQ")
+
+
+def cache_dir():
+    """返回缓存目录，关闭缓存时返回 None"""
+    if sys.byteorder != "little":
+        return None
+    path = os.environ.get("JASMIANA_2048_CACHE")
+    if path is None:
+        path = os.path.join(os.path.expanduser("~"), ".cache", "2048-jasmiana")
+    return path or None
+
+
+def cache_path(name, key):
+    directory = cache_dir()
+    if directory is None:
+        return None
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"{name}-{digest}.bin")
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, count = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} 不是查找表缓存文件")
+            specs = [TABLE.unpack_from(mm, HEADER.size + i * TABLE.size) for i in range(count)]
+            offset = HEADER.size + count * TABLE.size
+            tables = []
+            for typecode, length in specs:
+                size = array(typecode.decode()).itemsize * length
+                if offset + size > len(mm):
+                    raise ValueError(f"{path} 不完整")
+                # Lists index faster than memoryviews in the search, so copy out of the mapping
+                with memoryview(mm)[offset:offset + size] as raw, raw.cast(typecode.decode()) as view:
+                    tables.append(view.tolist())
+                offset += size
+    return tables
+
+
+def _write(path, tables):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so other processes never read half a file
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(tables)))
+        for typecode, values in tables:
+            f.write(TABLE.pack(typecode.encode(), len(values)))
+        for typecode, values in tables:
+            f.write(array(typecode, values).tobytes())
+    os.replace(temp, path)
+
+
+def load_tables(name, key, build):
+    """读取缓存的查找表，没有缓存时调用 build() 构建并写入缓存
+
+    build() 返回 [(类型码, 列表)]，类型码与 array 模块相同；
+    key 是生成参数 (包括版本号)，repr 相同的 key 共用同一个缓存文件。
+    返回的表都是列表。
+    """
+    path = cache_path(name, key)
+    if path is not None:
+        try:
+            tables = _read(path)
+        except (OSError, ValueError, struct.error):
+            pass
+        else:
+            return tables
+
+    tables = build()
+    if path is not None:
+        try:
+            _write(path, tables)
+        except OSError:
+            # A read-only home directory only costs the rebuild next time
+            pass
+    return [values for _, values in tables]
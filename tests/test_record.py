@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import GameEngine
+from record import GameRecordReader, GameRecordWriter
+
+
+def play(archive, seed, moves, finish):
+    """在 archive 后面追加一局，finish 为 None 时不写结束标记 (模拟进程中断)"""
+    engine = GameEngine(seed=seed)
+    engine.recorder = GameRecordWriter(archive, seed=seed)
+    engine.reset()
+    played = 0
+    while played < moves:
+        legal = engine.legal_moves()
+        if not legal:
+            break
+        engine.move(legal[played % len(legal)])
+        played += 1
+    if finish == "close":
+        engine.recorder.close(engine.score)
+    elif finish == "unfinished":
+        engine.recorder.close(None)
+    else:
+        archive.flush()
+    return played, engine.score
+
+
+def read_games(path):
+    with GameRecordReader(path) as reader:
+        return [(game.seed, len(game), game.final_score) for game in reader.games()]
+
+
+def test_unfinished_game_followed_by_finished_game(tmp_path):
+    path = tmp_path / "archive.rec"
+    with open(path, "ab") as archive:
+        first, _ = play(archive, 1, 20, "unfinished")
+        second, score = play(archive, 2, 50, "close")
+    assert read_games(path) == [(1, first, None), (2, second, score)]
+
+
+def test_game_without_marker_stops_at_next_header(tmp_path):
+    path = tmp_path / "archive.rec"
+    with open(path, "ab") as archive:
+        # Long enough to cross checkpoints before the next header
+        first, _ = play(archive, 3, 150, None)
+        second, score = play(archive, 4, 30, "close")
+    assert read_games(path) == [(3, first, None), (4, second, score)]
@@ -0,0 +1,110 @@
+"""
+置换表 (transposition table)
+
+缓存 Expectimax 搜索中已经计算过的节点值，键为 (棋盘, 剩余深度, 节点类型)。
+表的容量有上限，满了以后按替换策略淘汰旧条目：
+- "lru":   淘汰最久未使用的条目
+- "depth": 优先淘汰剩余深度最浅的条目 (其子树最便宜，重新计算的代价最小)
+
+容量为 0 (或负数) 时不缓存任何内容，相当于关闭置换表。
+"""
+
+from collections import OrderedDict
+
+POLICIES = ("lru", "depth")
+
+
+class TranspositionTable:
+    def __init__(self, max_size=200000, policy="lru"):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的替换策略: {policy}")
+        self.max_size = max_size
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clear()
+
+    def clear(self):
+        """清空缓存 (不重置计数器)"""
+        self._entries = OrderedDict()
+        # depth -> OrderedDict, only used by the depth-preferred policy
+        self._buckets = {}
+
+    def __len__(self):
+        if self.policy == "lru":
+            return len(self._entries)
+        return sum(len(bucket) for bucket in self._buckets.values())
+
+    def lookup(self, board, depth, is_max):
+        """查找缓存值，未命中返回 None"""
+        if self.max_size <= 0:
+            self.misses += 1
+            return None
+        key = (board << 5) | (depth << 1) | is_max
+        if self.policy == "lru":
+            entries = self._entries
+        else:
+            entries = self._buckets.get(depth)
+            if entries is None:
+                self.misses += 1
+                return None
+
+        value = entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entries.move_to_end(key)
+        return value
+
+    def store(self, board, depth, is_max, value):
+        """写入缓存，必要时淘汰旧条目"""
+        if self.max_size <= 0:
+            return
+        key = (board << 5) | (depth << 1) | is_max
+        if self.policy == "lru":
+            entries = self._entries
+            if key not in entries and len(entries) >= self.max_size:
+                entries.popitem(last=False)
+                self.evictions += 1
+            entries[key] = value
+            return
+
+        bucket = self._buckets.get(depth)
+        if bucket is None:
+            bucket = self._buckets[depth] = OrderedDict()
+        if key not in bucket and len(self) >= self.max_size:
+            # Evict from the shallowest bucket that is not deeper than the new entry
+            victim = None
+            for d in sorted(self._buckets):
+                if d > depth:
+                    break
+                if self._buckets[d]:
+                    victim = self._buckets[d]
+                    break
+            if victim is None:
+                # Everything cached is more valuable than this entry
+                return
+            victim.popitem(last=False)
+            self.evictions += 1
+        bucket[key] = value
+
+    def stats(self):
+        """返回命中/未命中/淘汰计数"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "policy": self.policy,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def reset_stats(self):
+        """重置计数器"""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
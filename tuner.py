@@ -0,0 +1,193 @@
+"""
+离线调整评估函数的权重
+
+评估函数 (evaluate_position / TableHeuristic) 的参数:
+- position_base: 位置权重矩阵的底数，矩阵保持默认的蛇形顺序，第 k 格的权重为 base ** k
+  (默认 2，即 DEFAULT_WEIGHT_MATRIX)
+- empty_weight, merge_weight, smoothness_weight, monotonicity_weight, max_tile_weight
+
+采用坐标搜索: 依次把每个参数乘以或除以 2 ** step (position_base 的步长按 scale 缩小)，
+用同一批种子跑自我对弈 (可多进程)，平均分数更高就接受；一轮下来没有改进则步长减半。
+所有候选都在相同的种子上对局，所以可以逐局和当前最优比较分数差。
+候选按批次对局，分数差的均值加上 reject_z 倍标准误仍小于 0 时判定明显更差，提前淘汰。
+
+最优配置写入权重文件 (默认 weights.json)，agent.py 启动时会读取，
+selfplay.py 可用 --weights 指定。
+
+用法示例:
+    python tuner.py --games 40 --batch 8 --workers 4 --output weights.json
+"""
+
+import argparse
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from heuristic import DEFAULT_WEIGHT_MATRIX, DEFAULT_WEIGHTS_FILE, save_weights
+from selfplay import play_game
+
+# name: (default, step scale)
+PARAMETERS = {
+    "position_base": (2.0, 0.25),
+    "empty_weight": (2000.0, 1.0),
+    "merge_weight": (800.0, 1.0),
+    "smoothness_weight": (100.0, 1.0),
+    "monotonicity_weight": (2.0, 1.0),
+    "max_tile_weight": (1.0, 1.0),
+}
+
+
+def default_params():
+    return {name: default for name, (default, _) in PARAMETERS.items()}
+
+
+def params_to_weights(params):
+    """把调参用的参数转换为 Searcher 的权重参数"""
+    base = params["position_base"]
+    weights = {name: value for name, value in params.items() if name != "position_base"}
+    # The default matrix holds 2 ** rank, so its exponents give the snake order
+    weights["weight_matrix"] = [[base ** (v.bit_length() - 1) for v in row]
+                                for row in DEFAULT_WEIGHT_MATRIX]
+    return weights
+
+
+class Tuner:
+    def __init__(self, games=20, batch=5, seed=0, depth=3, workers=1, max_moves=None,
+                 step=1.0, min_step=0.125, max_evals=100, reject_z=2.0, log=None):
+        self.games = games
+        self.batch = batch
+        self.seed = seed
+        self.depth = depth
+        self.workers = workers
+        self.max_moves = max_moves
+        self.step = step
+        self.min_step = min_step
+        self.max_evals = max_evals
+        self.reject_z = reject_z
+        self.log = log
+        self.evals = 0
+        self._pool = None
+
+    def note(self, message):
+        if self.log is not None:
+            print(message, file=self.log, flush=True)
+
+    def _get_pool(self):
+        """获取对局进程池 (第一次使用时创建，run 结束时关闭)"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        """关闭对局进程池"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _play(self, params, first, count):
+        # Candidates are usually played once, keep their tables out of the disk cache
+        config = {"depth": self.depth, "cache_tables": False}
+        config.update(params_to_weights(params))
+        seeds = range(self.seed + first, self.seed + first + count)
+        if self.workers <= 1:
+            return [play_game(seed, config, self.max_moves) for seed in seeds]
+        # Every batch reuses the same worker processes and their move tables
+        return list(self._get_pool().map(play_game, seeds, [config] * count, [self.max_moves] * count))
+
+    def evaluate(self, params, reference=None):
+        """在全部种子上评估一组参数，返回每局摘要；明显不如 reference 时提前返回 None
+
+        reference 是当前最优参数在相同种子上的每局摘要。
+        """
+        self.evals += 1
+        results = []
+        while len(results) < self.games:
+            results += self._play(params, len(results), min(self.batch, self.games - len(results)))
+            if reference is None or len(results) >= self.games or len(results) < 2:
+                continue
+            diffs = [r["score"] - ref["score"] for r, ref in zip(results, reference)]
+            mean = sum(diffs) / len(diffs)
+            variance = sum((d - mean) ** 2 for d in diffs) / (len(diffs) - 1)
+            if mean + self.reject_z * math.sqrt(variance / len(diffs)) < 0:
+                self.note(f"  {len(results)} 局后淘汰 (平均分差 {mean:+.0f})")
+                return None
+        return results
+
+    def run(self, params=None):
+        """坐标搜索，返回 (最优参数, 最优参数的每局摘要)"""
+        best = dict(params or default_params())
+        try:
+            best_results = self.evaluate(best)
+            self.note(f"初始参数: 平均分数 {mean_score(best_results):.0f}")
+            step = self.step
+            while step >= self.min_step and self.evals < self.max_evals:
+                improved = False
+                for name, (_, scale) in PARAMETERS.items():
+                    for sign in (1, -1):
+                        if self.evals >= self.max_evals:
+                            break
+                        candidate = dict(best)
+                        candidate[name] = best[name] * 2 ** (sign * step * scale)
+                        self.note(f"[{self.evals}] {name}: {best[name]:.4g} -> {candidate[name]:.4g}")
+                        results = self.evaluate(candidate, best_results)
+                        if results is None:
+                            continue
+                        score = mean_score(results)
+                        self.note(f"  平均分数 {score:.0f} (当前最优 {mean_score(best_results):.0f})")
+                        if score > mean_score(best_results):
+                            best, best_results = candidate, results
+                            improved = True
+                            break
+                if not improved:
+                    step /= 2
+                    self.note(f"本轮没有改进，步长减半为 {step:g}")
+            return best, best_results
+        finally:
+            self.close()
+
+
+def mean_score(results):
+    return sum(r["score"] for r in results) / len(results)
+
+
+def tile_rate(results, tile):
+    return sum(1 for r in results if r["max_tile"] >= tile) / len(results)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="用自我对弈离线调整评估函数的权重")
+    parser.add_argument("--games", type=int, default=20, help="每个候选的对局数量")
+    parser.add_argument("--batch", type=int, default=5, help="每批对局数量 (每批之后检查是否提前淘汰)")
+    parser.add_argument("--seed", type=int, default=0, help="第一局的随机种子，所有候选使用相同的种子")
+    parser.add_argument("--depth", type=int, default=3, help="搜索深度")
+    parser.add_argument("--workers", type=int, default=1, help="并行运行对局的进程数")
+    parser.add_argument("--max-moves", type=int, default=None, help="每局最多走多少步")
+    parser.add_argument("--max-evals", type=int, default=100, help="最多评估多少组参数")
+    parser.add_argument("--step", type=float, default=1.0, help="初始步长 (参数乘以或除以 2 ** step)")
+    parser.add_argument("--min-step", type=float, default=0.125, help="步长小于该值时停止")
+    parser.add_argument("--reject-z", type=float, default=2.0,
+                        help="提前淘汰的严格程度 (分数差均值 + z 倍标准误 < 0 时淘汰)")
+    parser.add_argument("--output", default=DEFAULT_WEIGHTS_FILE, help="最优配置的输出文件")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    tuner = Tuner(args.games, args.batch, args.seed, args.depth, args.workers, args.max_moves,
+                  args.step, args.min_step, args.max_evals, args.reject_z, log=sys.stdout)
+    start = time.perf_counter()
+    best, results = tuner.run()
+    elapsed = time.perf_counter() - start
+
+    save_weights(args.output, params_to_weights(best), params=best, mean_score=mean_score(results),
+                 rate_4096=tile_rate(results, 4096), games=args.games, seed=args.seed, depth=args.depth)
+    print(f"评估了 {tuner.evals} 组参数，用时 {elapsed:.1f}s")
+    print(f"最优参数: {best}")
+    print(f"平均分数: {mean_score(results):.0f}  达成 4096: {tile_rate(results, 4096) * 100:.1f}%")
+    print(f"已保存到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())